@@ -0,0 +1,214 @@
+"""Benchmark and load-test harness for the chatbot request path.
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_chatbot --output bench_results.json``.
+Results are written as JSON so runs can be compared between releases.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+import openai
+import pandas as pd
+
+import chatbot
+from knowledge_base import DEFAULT_CSV_PATH, compile_knowledge_base, load_knowledge_base, open_compiled
+from llm_client import LLMClient
+from response_cache import ResponseCache
+from stub_openai import StubOpenAIServer
+
+APP_SCRIPT = 'Backpackchat_deploy_key.py'
+
+
+# Latency summary in milliseconds
+def summarize(seconds):
+    values = np.asarray(seconds) * 1000
+    return {
+        'count': int(len(values)),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max()),
+    }
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+# Write a CSV with n rows by repeating the real questions with a numbered variant suffix
+def synthetic_csv(path, rows):
+    source = pd.read_csv(DEFAULT_CSV_PATH)
+    repeats = -(-rows // len(source))
+    df = pd.concat([source] * repeats, ignore_index=True).iloc[:rows].copy()
+    df['Question'] = [f"{question} (variant {row})" for row, question in enumerate(df['Question'])]
+    df.to_csv(path, index=False)
+    return df['Question'].tolist()
+
+
+# Exact-hit lookup latency as the knowledge base grows
+def bench_exact_hit(sizes, lookups, workdir):
+    results = []
+    for rows in sizes:
+        csv_path = os.path.join(workdir, f'kb_{rows}.csv')
+        artifact_path = os.path.join(workdir, f'kb_{rows}.kb')
+        questions = synthetic_csv(csv_path, rows)
+        _, compile_seconds = timed(compile_knowledge_base, csv_path, artifact_path)
+        kb, load_seconds = timed(open_compiled, artifact_path, csv_path)
+
+        sample = random.Random(rows).choices(questions, k=lookups)
+        latencies = []
+        for question in sample:
+            match, seconds = timed(kb.search, question)
+            assert match is not None
+            latencies.append(seconds)
+        results.append({'rows': rows, 'compile_s': compile_seconds, 'load_s': load_seconds,
+                        'lookup': summarize(latencies)})
+        print(f"exact hit, {rows} rows: p50 {results[-1]['lookup']['p50_ms']:.4f} ms")
+    return results
+
+
+# Miss-path latency against the local stub, non-streaming and time to first streamed token
+def bench_miss_path(kb, delays, requests, workdir):
+    results = []
+    for delay in delays:
+        stub = StubOpenAIServer(delay=delay).start()
+        try:
+            client = LLMClient(chatbot.MODEL, api_base=stub.api_base)
+            cache = ResponseCache(os.path.join(workdir, f'miss_{delay}.sqlite3'))
+            complete, first_token = [], []
+            for i in range(requests):
+                _, seconds = timed(chatbot.generate_response, f"Unseen question {delay} {i}", kb, cache, client)
+                complete.append(seconds)
+
+                start = time.perf_counter()
+                answer, _ = chatbot.generate_response(f"Unseen streamed question {delay} {i}", kb, cache, client,
+                                                      stream=True)
+                next(answer)
+                first_token.append(time.perf_counter() - start)
+                for _ in answer:
+                    pass
+            results.append({'stub_delay_s': delay, 'complete': summarize(complete),
+                            'time_to_first_token': summarize(first_token)})
+            print(f"miss path, stub delay {delay}s: p50 {results[-1]['complete']['p50_ms']:.1f} ms")
+        finally:
+            stub.shutdown()
+    return results
+
+
+# Full-script rerun cost through Streamlit's AppTest
+def bench_rerun(reruns, stub):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=60)
+    at.secrets['openai_api_key'] = 'benchmark'
+    at.secrets['google_maps_api_key'] = 'benchmark'
+    at.secrets['openai_api_base'] = stub.api_base
+    _, cold_seconds = timed(at.run)
+
+    warm = [timed(at.run)[1] for _ in range(reruns)]
+    question = load_knowledge_base().questions[0]
+    chat = []
+    for _ in range(reruns):
+        at.text_input[-1].input(question)
+        chat.append(timed(at.run)[1])
+    return {'cold_s': cold_seconds, 'rerun': summarize(warm), 'rerun_with_chat_hit': summarize(chat),
+            'exceptions': [str(exception.value) for exception in at.exception]}
+
+
+# Concurrent sessions sending a mix of CSV hits, trending repeats and unique misses
+def bench_load(kb, sessions, turns, hit_ratio, delay, workdir):
+    stub = StubOpenAIServer(delay=delay).start()
+    try:
+        client = LLMClient(chatbot.MODEL, api_base=stub.api_base)
+        cache = ResponseCache(os.path.join(workdir, 'load.sqlite3'))
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def session(number):
+            rng = random.Random(number)
+            for turn in range(turns):
+                roll = rng.random()
+                if roll < hit_ratio:
+                    question = rng.choice(kb.questions)
+                elif roll < hit_ratio + (1 - hit_ratio) / 2:
+                    question = f"Trending question {turn}"
+                else:
+                    question = f"Unique question from session {number} turn {turn}"
+                try:
+                    _, seconds = timed(chatbot.generate_response, question, kb, cache, client)
+                except openai.error.OpenAIError as error:
+                    with lock:
+                        errors.append(repr(error))
+                    continue
+                with lock:
+                    latencies.append(seconds)
+
+        threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        result = {'sessions': sessions, 'turns_per_session': turns, 'hit_ratio': hit_ratio, 'stub_delay_s': delay,
+                  'elapsed_s': elapsed, 'throughput_rps': len(latencies) / elapsed, 'latency': summarize(latencies),
+                  'errors': len(errors), 'upstream_requests': len(stub.requests), 'coalesced': client.coalesced,
+                  'response_cache': cache.stats()}
+        print(f"load, {sessions} sessions: {result['throughput_rps']:.1f} req/s, "
+              f"{result['upstream_requests']} upstream calls")
+        return result
+    finally:
+        stub.shutdown()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000],
+                        help="Knowledge base sizes (rows) for the exact-hit benchmark")
+    parser.add_argument('--lookups', type=int, default=10_000, help="Lookups per size")
+    parser.add_argument('--delays', type=float, nargs='+', default=[0.0, 0.05, 0.2],
+                        help="Stub OpenAI response delays (seconds) for the miss-path benchmark")
+    parser.add_argument('--requests', type=int, default=20, help="Requests per stub delay")
+    parser.add_argument('--reruns', type=int, default=10, help="Script reruns for the AppTest benchmark")
+    parser.add_argument('--sessions', type=int, default=20, help="Concurrent sessions for the load generator")
+    parser.add_argument('--turns', type=int, default=10, help="Chat turns per session")
+    parser.add_argument('--hit-ratio', type=float, default=0.7, help="Share of load-test questions found in the CSV")
+    parser.add_argument('--load-delay', type=float, default=0.2, help="Stub delay (seconds) during the load test")
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    openai.api_key = openai.api_key or 'benchmark'
+    report = {'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'git_revision': git_revision(),
+                       'python': platform.python_version(), 'platform': platform.platform(), 'args': vars(args)}}
+    with tempfile.TemporaryDirectory() as workdir:
+        kb = load_knowledge_base(DEFAULT_CSV_PATH, os.path.join(workdir, 'kb.kb'))
+        report['exact_hit'] = bench_exact_hit(args.sizes, args.lookups, workdir)
+        report['miss_path'] = bench_miss_path(kb, args.delays, args.requests, workdir)
+        stub = StubOpenAIServer(delay=args.load_delay).start()
+        try:
+            report['rerun'] = bench_rerun(args.reruns, stub)
+        finally:
+            stub.shutdown()
+        report['load'] = bench_load(kb, args.sessions, args.turns, args.hit_ratio, args.load_delay, workdir)
+
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    print(f"Wrote {args.output}")
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import time
+from logging.handlers import RotatingFileHandler
+
+import metrics
+from conversation import SUMMARY_INSTRUCTIONS
+from retrieval import DEFAULT_SIMILARITY_THRESHOLD
+
+# Model settings for questions the CSV cannot answer
+MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a helpful assistant focused on helping backpackers."
+
+# Questions the CSV could not answer, one JSON line each, mined offline by pregenerate.py
+DEFAULT_MISSED_QUESTIONS_LOG = os.path.join('.cache', 'missed_questions.jsonl')
+missed_questions = logging.getLogger('botwander.missed_questions')
+
+
+# Append missed questions to a rotating JSONL file
+def log_missed_questions_to(path=DEFAULT_MISSED_QUESTIONS_LOG, max_bytes=10 * 1024 * 1024, backup_count=5):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    missed_questions.propagate = False
+    missed_questions.setLevel(logging.INFO)
+    if not missed_questions.handlers:
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        missed_questions.addHandler(handler)
+
+
+# System prompt for questions about the selected country
+def system_prompt(country=None):
+    if country is None:
+        return SYSTEM_PROMPT
+    return f"{SYSTEM_PROMPT} The backpacker is travelling in {country}."
+
+
+# Messages sent to GPT-3.5 Turbo for a question
+def chat_messages(question, system=SYSTEM_PROMPT):
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": question}
+    ]
+
+
+# Summarize older conversation turns with GPT-3.5 Turbo, for ConversationMemory.build_messages
+def summarizer(llm_client):
+    def summarize(text):
+        return llm_client.complete([
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": text}
+        ])
+    return summarize
+
+
+# Add a finished turn to the session's conversation memory, if it has one
+def remember(memory, question, answer, image_url, country=None):
+    if memory is not None:
+        memory.add_turn(question, answer, image_url, country=country)
+
+
+# Stream a GPT-3.5 Turbo answer as text chunks; once it is complete it is cached under cache_context (by default
+# the system prompt) and remembered
+def stream_answer(question, response_cache, llm_client, messages=None, memory=None, cache_context=None, country=None):
+    messages = messages or chat_messages(question)
+    chunks = []
+    start = time.perf_counter()
+    with metrics.span('llm', mode='stream'):
+        for content in llm_client.stream(messages):
+            if not chunks:
+                metrics.REGISTRY.observe('llm_first_token_seconds', time.perf_counter() - start)
+            chunks.append(content)
+            yield content
+    answer = "".join(chunks)
+    response_cache.put(question, MODEL, cache_context or messages[0]['content'], answer)
+    remember(memory, question, answer, None, country)
+
+
+# Answer a question from the knowledge base, the response cache or the model, in that order.
+# Returns (answer, image_url); with stream=True a model answer is an iterator of text chunks instead of a string.
+# With a ConversationMemory the model sees a token-budgeted prompt of relevant CSV rows and, for follow-up
+# questions ("Which of those...?"), a summary of older turns and the recent turns. Follow-ups skip the CSV, are
+# cached under their whole prompt rather than shared by question, and are marked as such in the missed-question
+# log so pregenerate.py leaves them out. kb is the selected country's shard, and country (if given) is named in
+# the system prompt.
+def generate_response(question, kb, response_cache, llm_client, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                      stream=False, memory=None, country=None):
+    # A page rerun with the question still in the input box shows the answer it already got
+    repeat = memory.repeat_of(question, country) if memory is not None else None
+    if repeat is not None:
+        return repeat[1], repeat[2]
+
+    metrics.inc('chat_requests_total')
+    follow_up = memory is not None and memory.needs_history(question)
+
+    # Check if the question, or a close rewording of it, exists in the CSV
+    if not follow_up:
+        with metrics.span('kb_search'):
+            match = kb.search(question, similarity_threshold)
+        if match is not None:
+            metrics.inc('answers_total', source='csv')
+            remember(memory, question, *match, country)
+            return match
+
+    # If the question is not found in the CSV, reuse a cached model answer or ask GPT-3.5 Turbo
+    system = system_prompt(country)
+    messages, cache_context = None, system
+    if follow_up:
+        with metrics.span('build_prompt'):
+            messages = memory.build_messages(question, kb, system, summarizer(llm_client))
+        cache_context = json.dumps(messages[:-1])
+    with metrics.span('response_cache'):
+        answer = response_cache.get(question, MODEL, cache_context)
+    missed_questions.info(json.dumps({'ts': time.time(), 'question': question, 'country': country,
+                                      'follow_up': follow_up,
+                                      'source': 'llm' if answer is None else 'response_cache'}))
+    if answer is not None:
+        metrics.inc('answers_total', source='response_cache')
+        remember(memory, question, answer, None, country)
+        return answer, None
+
+    metrics.inc('answers_total', source='llm')
+    if messages is None and memory is not None:
+        with metrics.span('build_prompt'):
+            messages = memory.build_messages(question, kb, system, summarizer(llm_client))
+    elif messages is None:
+        messages = chat_messages(question, system)
+    if stream:
+        return stream_answer(question, response_cache, llm_client, messages, memory, cache_context, country), None
+    with metrics.span('llm', mode='complete'):
+        answer = llm_client.complete(messages)
+    response_cache.put(question, MODEL, cache_context, answer)
+    remember(memory, question, answer, None, country)
+    return answer, None
@@ -0,0 +1,56 @@
+import json
+import os
+from functools import lru_cache
+
+CONTENT_DIR = 'content'
+GUIDES_PATH = os.path.join(CONTENT_DIR, 'guides.json')
+STYLE_PATH = os.path.join(CONTENT_DIR, 'style.css')
+
+
+# Static page content (country pages, interest guides, itinerary help), parsed once per process
+@lru_cache(maxsize=None)
+def load_guides(path=GUIDES_PATH):
+    with open(path, encoding='utf-8') as guides:
+        return json.load(guides)
+
+
+# Custom CSS for the whole page, wrapped in a single <style> block
+@lru_cache(maxsize=None)
+def page_style(path=STYLE_PATH):
+    with open(path, encoding='utf-8') as style:
+        return f"<style>\n{style.read()}</style>"
+
+
+# Markdown for a country page below its banner image (the tips table is built from the tips list)
+@lru_cache(maxsize=None)
+def country_markdown(country):
+    page = load_guides()['countries'][country]
+    if 'intro' not in page:
+        return ""
+
+    rows = [f"| **{tip['tip']}** | {tip['details']} |" for tip in page['tips']]
+    table = "\n".join(["| **Tip** | **Details** |", "|---|---|", *rows])
+    return "\n\n".join([page['intro'], page['tips_intro'], table, page['closing']])
+
+
+# Markdown for an interest guide, or None if there is no guide for that interest yet
+@lru_cache(maxsize=None)
+def interest_markdown(interest):
+    guide = load_guides()['interests'].get(interest)
+    if guide is None:
+        return None
+
+    parts = [f"### {guide['title']}", guide['intro']]
+    for number, section in enumerate(guide['sections'], start=1):
+        parts.append(f"### {number}. {section['heading']}")
+        parts.append("\n".join(f"- **Question Example**: \"{example}\"" for example in section['examples']))
+        parts.append(section['details'])
+    return "\n\n".join(parts)
+
+
+# Markdown for the itinerary help above the embedded Google Doc
+@lru_cache(maxsize=None)
+def itinerary_markdown():
+    itinerary = load_guides()['itinerary']
+    examples = "\n".join(f"- {example}" for example in itinerary['examples'])
+    return f"### {itinerary['heading']}\n\n#### Question Example:\n\n{examples}"
@@ -0,0 +1,152 @@
+import math
+
+import metrics
+from text_utils import normalize_question
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to an estimate of ~4 characters per token
+    tiktoken = None
+
+# Upper bound on prompt tokens for a chat turn, however long the conversation gets
+DEFAULT_TOKEN_BUDGET = 1500
+
+# Share of the budget for each part of the prompt; the rest is left for the system prompt and the question
+CONTEXT_SHARE = 0.3
+SUMMARY_SHARE = 0.15
+HISTORY_SHARE = 0.4
+
+# Knowledge base rows injected as context must be at least this similar to the question
+CONTEXT_MIN_SIMILARITY = 0.3
+CONTEXT_ROWS = 3
+
+# Words that refer back to earlier turns ("Which of those...", "How do I get there?"). A question using one is
+# answered with the conversation history; any other question stands alone and its answer can be shared.
+FOLLOW_UP_WORDS = {'it', 'its', 'that', 'those', 'these', 'this', 'they', 'them', 'their', 'there', 'he', 'she',
+                   'one', 'ones', 'else', 'other', 'others', 'another', 'same', 'previous', 'earlier', 'above',
+                   'more', 'again'}
+
+SUMMARY_INSTRUCTIONS = ("Summarize this conversation between a backpacker and a travel assistant in a few sentences. "
+                        "Keep destinations, budgets, dates and preferences the backpacker mentioned.")
+
+_encoding = tiktoken.get_encoding('cl100k_base') if tiktoken else None
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+# Cut text down to at most max_tokens, keeping the start
+def truncate(text, max_tokens):
+    if count_tokens(text) <= max_tokens:
+        return text
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+# True if the question refers back to earlier turns, so its answer depends on the conversation
+def is_follow_up(question):
+    return not FOLLOW_UP_WORDS.isdisjoint(normalize_question(question).split())
+
+
+# Per-session chat memory kept in st.session_state: recent turns verbatim, older turns folded into a summary,
+# and only the knowledge base rows relevant to the current question, all within a fixed token budget.
+# Turns are kept whatever answered them (the knowledge base, the response cache or the model).
+class ConversationMemory:
+    def __init__(self, budget=DEFAULT_TOKEN_BUDGET):
+        self.budget = budget
+        self.turns = []  # (question, answer, image_url, country), oldest first
+        self.summary = ""
+
+    @property
+    def history_budget(self):
+        return int(self.budget * HISTORY_SHARE)
+
+    def _turn_tokens(self, turn):
+        return count_tokens(turn[0]) + count_tokens(turn[1])
+
+    # True if the prompt for this question would include earlier turns or their summary
+    def needs_history(self, question):
+        return bool(self.turns or self.summary) and is_follow_up(question)
+
+    # The latest turn if it was this question about the same country, so reruns of the page don't ask again
+    def repeat_of(self, question, country=None):
+        if self.turns and self.turns[-1][0] == question and self.turns[-1][3] == country:
+            return self.turns[-1]
+        return None
+
+    # Knowledge base rows similar to the question, formatted as notes within the context budget
+    def context(self, question, kb):
+        budget = int(self.budget * CONTEXT_SHARE)
+        notes = []
+        for row, score in kb.retriever.search(question, k=CONTEXT_ROWS):
+            if score < CONTEXT_MIN_SIMILARITY:
+                break
+            note = f"Q: {kb.questions[row]}\nA: {kb.answers[row]}"
+            if count_tokens(note) > budget:
+                note = truncate(note, budget)
+            budget -= count_tokens(note)
+            notes.append(note)
+            if budget <= 0:
+                break
+        return "\n\n".join(notes)
+
+    # Chat messages for the question: system prompt, relevant notes and the question, plus the summary and recent
+    # turns if it is a follow-up (see needs_history). Turns beyond the history budget are folded into the summary
+    # first (see compact), so summarizing only ever happens just before a model call.
+    def build_messages(self, question, kb, system_prompt, summarize=None):
+        history = self.needs_history(question)
+        if history:
+            self.compact(summarize)
+        messages = [{"role": "system", "content": system_prompt}]
+        context = self.context(question, kb)
+        if context:
+            messages.append({"role": "system",
+                             "content": f"Notes from the BotWander travel knowledge base that may help:\n\n{context}"})
+        if history and self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+
+        recent, budget = [], self.history_budget
+        for turn in reversed(self.turns if history else []):
+            budget -= self._turn_tokens(turn)
+            if budget < 0:
+                break
+            recent[:0] = [{"role": "user", "content": turn[0]}, {"role": "assistant", "content": turn[1]}]
+        messages.extend(recent)
+        messages.append({"role": "user", "content": question})
+
+        metrics.inc('prompt_tokens_estimated_total', sum(count_tokens(message['content']) for message in messages))
+        return messages
+
+    # Record a finished turn. This never calls the model, so answers are not held up by summarizing; if turns
+    # pile up without a follow-up question to summarize them they are folded into the summary by truncation.
+    def add_turn(self, question, answer, image_url=None, country=None):
+        self.turns.append((question, answer, image_url, country))
+        if sum(self._turn_tokens(turn) for turn in self.turns) > self.budget:
+            self.compact()
+
+    # Once the turns outgrow the history budget, fold the oldest into the summary until half the budget is left,
+    # so the model is asked to summarize every few follow-ups, not every turn. summarize(text) returns a
+    # summary string (e.g. from the model); without one, or if it fails, the old summary and turns are truncated.
+    def compact(self, summarize=None):
+        tokens = sum(self._turn_tokens(turn) for turn in self.turns)
+        if tokens <= self.history_budget:
+            return
+        overflow = []
+        while len(self.turns) > 1 and tokens > self.history_budget // 2:
+            overflow.append(self.turns.pop(0))
+            tokens -= self._turn_tokens(overflow[-1])
+
+        transcript = "\n".join(f"Backpacker: {turn[0]}\nAssistant: {turn[1]}" for turn in overflow)
+        text = f"{self.summary}\n{transcript}".strip()
+        summary = None
+        if summarize is not None:
+            try:
+                with metrics.span('summarize'):
+                    summary = summarize(text)
+            except Exception:
+                summary = None
+        self.summary = truncate(summary or text, int(self.budget * SUMMARY_SHARE))
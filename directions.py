@@ -0,0 +1,276 @@
+import heapq
+import html
+import http.client
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import metrics
+from content import CONTENT_DIR
+from response_cache import TOUCH_BATCH_SIZE, TOUCH_FLUSH_SECONDS, open_database
+from text_utils import normalize_question
+
+GRAPH_PATH = os.path.join(CONTENT_DIR, 'mrt_graph.json')
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'routes.sqlite3')
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_TIMEOUT_SECONDS = 5
+
+GOOGLE_DIRECTIONS_URL = 'https://maps.googleapis.com/maps/api/directions/json'
+
+# After a failed Directions API call, use the offline MRT graph for this long before trying the API again
+FAILURE_RETRY_SECONDS = 300
+
+# When Google finds no route between two places, don't ask again for this long. Transit routes can come back
+# (e.g. once services start in the morning), so this is much shorter than the TTL of a found route.
+NO_ROUTE_TTL_SECONDS = 60 * 60
+
+# Words that don't change which place is meant: "Changi Airport Singapore" and "changi airport MRT" are one place
+_PLACE_NOISE = {'singapore', 'sg', 'mrt', 'station', 'stn'}
+
+
+# Cache key for a place: normalized text without country and station words
+def place_key(place):
+    words = normalize_question(place).split()
+    return ' '.join(word for word in words if word not in _PLACE_NOISE) or ' '.join(words)
+
+
+def route_key(origin, destination):
+    return f'{place_key(origin)}|{place_key(destination)}|transit'
+
+
+# Cache key recording that Google found no route for a route key
+def no_route_key(key):
+    return f'{key}|none'
+
+
+# MRT network as a graph of (station, line) nodes: riding to the next station costs the line's minutes per stop,
+# and changing lines at an interchange costs transfer_minutes. Places are matched to stations by name or alias.
+class TransitGraph:
+    def __init__(self, lines, aliases, transfer_minutes):
+        self.lines = lines
+        self.transfer_minutes = transfer_minutes
+        self.stations = {place_key(name): name for line in lines.values() for name in line['stations']}
+        self.aliases = {place_key(place): station for place, station in aliases.items()}
+        self._lines_at = {}
+        self._neighbours = {}
+        for code, line in lines.items():
+            stations = line['stations']
+            for i, station in enumerate(stations):
+                self._lines_at.setdefault(station, []).append(code)
+                nodes = self._neighbours.setdefault((station, code), [])
+                nodes.extend((stations[j], code) for j in (i - 1, i + 1) if 0 <= j < len(stations))
+
+    @classmethod
+    def from_file(cls, path=GRAPH_PATH):
+        with open(path, encoding='utf-8') as graph:
+            data = json.load(graph)
+        return cls(data['lines'], data['aliases'], data['transfer_minutes'])
+
+    # The station for a place name or alias, or None if the place is not near a known station
+    def resolve(self, place):
+        key = place_key(place)
+        return self.aliases.get(key) or self.stations.get(key)
+
+    # Dijkstra over (station, line) nodes. Returns (minutes, legs) with one (line, from, to, stops) leg per ride,
+    # or None if the stations are not connected.
+    def shortest_path(self, origin, destination):
+        queue = [(0, (origin, code)) for code in self._lines_at.get(origin, [])]
+        best = {node: 0 for _, node in queue}
+        previous = {}
+        while queue:
+            minutes, node = heapq.heappop(queue)
+            if minutes > best[node]:
+                continue
+            if node[0] == destination:
+                return minutes, self._legs(node, previous)
+
+            station, code = node
+            moves = [(neighbour, self.lines[code]['minutes_per_stop']) for neighbour in self._neighbours[node]]
+            moves.extend(((station, other), self.transfer_minutes) for other in self._lines_at[station] if other != code)
+            for neighbour, cost in moves:
+                if minutes + cost < best.get(neighbour, float('inf')):
+                    best[neighbour] = minutes + cost
+                    previous[neighbour] = node
+                    heapq.heappush(queue, (minutes + cost, neighbour))
+        return None
+
+    def _legs(self, node, previous):
+        path = [node]
+        while path[-1] in previous:
+            path.append(previous[path[-1]])
+        path.reverse()
+
+        legs = []
+        for (station, code), (next_station, next_code) in zip(path, path[1:]):
+            if code != next_code:
+                continue  # a transfer
+            if legs and legs[-1][0] == code and legs[-1][2] == station:
+                legs[-1] = (code, legs[-1][1], next_station, legs[-1][3] + 1)
+            else:
+                legs.append((code, station, next_station, 1))
+        return legs
+
+    # Public transport route between two places over the MRT network, in the same form as google_directions,
+    # or None if either place is not near a known station
+    def route(self, origin, destination):
+        start, end = self.resolve(origin), self.resolve(destination)
+        if start is None or end is None:
+            return None
+        path = self.shortest_path(start, end)
+        if path is None:
+            return None
+
+        minutes, legs = path
+        if start == end:
+            return {'origin': origin, 'destination': destination, 'minutes': 0, 'source': 'offline',
+                    'steps': [f"Walk from {origin} to {destination}, both near {start} MRT station"]}
+        steps = []
+        if place_key(origin) != place_key(start):
+            steps.append(f"Walk from {origin} to {start} MRT station")
+        for code, board, alight, stops in legs:
+            steps.append(f"Take the {self.lines[code]['name']} from {board} to {alight} "
+                         f"({stops} stop{'s' if stops != 1 else ''})")
+        if place_key(destination) != place_key(end):
+            steps.append(f"Walk from {end} MRT station to {destination}")
+        return {'origin': origin, 'destination': destination, 'minutes': round(minutes), 'steps': steps,
+                'source': 'offline'}
+
+
+# Public transport route from the Google Directions API as {origin, destination, minutes, steps, source},
+# or None if Google finds no route. Raises OSError, ValueError or HTTPException if the API cannot be used.
+def google_directions(origin, destination, api_key, timeout=DEFAULT_TIMEOUT_SECONDS):
+    query = urllib.parse.urlencode({'origin': origin, 'destination': destination, 'mode': 'transit', 'key': api_key})
+    with metrics.span('directions_api'):
+        with urllib.request.urlopen(f'{GOOGLE_DIRECTIONS_URL}?{query}', timeout=timeout) as response:
+            data = json.load(response)
+        if data.get('status') in ('ZERO_RESULTS', 'NOT_FOUND'):
+            return None
+        if data.get('status') != 'OK':
+            raise ValueError(f"Directions API status {data.get('status')}: {data.get('error_message', '')}")
+
+        leg = data['routes'][0]['legs'][0]
+        steps = []
+        for step in leg['steps']:
+            transit = step.get('transit_details')
+            if transit:
+                line = transit['line'].get('short_name') or transit['line'].get('name')
+                steps.append(f"Take the {line} from {transit['departure_stop']['name']} to "
+                             f"{transit['arrival_stop']['name']} ({transit['num_stops']} stops)")
+            else:
+                steps.append(' '.join(html.unescape(re.sub(r'<[^>]+>', ' ', step['html_instructions'])).split()))
+    return {'origin': origin, 'destination': destination, 'minutes': round(leg['duration']['value'] / 60),
+            'steps': steps, 'source': 'google'}
+
+
+# Persistent cache of directions shared by every session, keyed by normalized place names, with a TTL and LRU eviction.
+# Like ResponseCache, hits write their access times in batches and database errors are misses or skipped stores.
+class RouteCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+
+        self._conn = open_database(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS routes ("
+            "key TEXT PRIMARY KEY, route TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS routes_accessed_at ON routes (accessed_at)")
+        self._conn.commit()
+
+    # Cached route for key, or None. ttl overrides the cache's TTL for this lookup.
+    def get(self, key, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT route, created_at FROM routes WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as error:
+                metrics.inc('errors_total', span='route_cache', error=type(error).__name__)
+                row = None
+            if row is None or now - row[1] > ttl:
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH_SIZE or time.monotonic() - self._flushed_at >= TOUCH_FLUSH_SECONDS:
+                self._flush_touches()
+            return json.loads(row[0])
+
+    # Write the access times of recent hits; call with the lock held
+    def _flush_touches(self):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        self._flushed_at = time.monotonic()
+        try:
+            with self._conn:
+                self._conn.executemany("UPDATE routes SET accessed_at = ? WHERE key = ?",
+                                       [(accessed_at, key) for key, accessed_at in touched.items()])
+        except sqlite3.Error as error:
+            metrics.inc('errors_total', span='route_cache', error=type(error).__name__)
+
+    def put(self, key, route):
+        now = time.time()
+        with self._lock:
+            self._flush_touches()
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO routes (key, route, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(route), now, now),
+                    )
+                    self._conn.execute(
+                        "DELETE FROM routes WHERE key IN ("
+                        "SELECT key FROM routes ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+            except sqlite3.Error as error:
+                metrics.inc('errors_total', span='route_cache', error=type(error).__name__)
+
+
+# Directions for the Route tab: cached routes first, then the Google Directions API (server side, when an API key
+# is configured), then shortest paths over the bundled MRT graph, which works without network access
+class DirectionsService:
+    def __init__(self, cache, graph, api_key=None, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.cache = cache
+        self.graph = graph
+        self.api_key = api_key
+        self.timeout = timeout
+        self._failed_at = -FAILURE_RETRY_SECONDS
+
+    # Return a route dict, or None if neither Google nor the MRT graph knows a route
+    def route(self, origin, destination):
+        key = route_key(origin, destination)
+        route = self.cache.get(key)
+        if route is not None:
+            metrics.inc('directions_total', source='cache')
+            return route
+
+        if (self.api_key and time.monotonic() - self._failed_at >= FAILURE_RETRY_SECONDS
+                and self.cache.get(no_route_key(key), ttl=NO_ROUTE_TTL_SECONDS) is None):
+            try:
+                route = google_directions(origin, destination, self.api_key, self.timeout)
+            except (OSError, ValueError, KeyError, IndexError, http.client.HTTPException):
+                # Counted in errors_total by the directions_api span
+                self._failed_at = time.monotonic()
+            else:
+                if route is None:
+                    # Every call is billed, so remember that Google has no route rather than asking on each rerun
+                    self.cache.put(no_route_key(key), {'origin': origin, 'destination': destination})
+            if route is not None:
+                self.cache.put(key, route)
+                metrics.inc('directions_total', source='google')
+                return route
+
+        # Offline routes are cheap to compute and not cached, so Google is used again once it is reachable
+        with metrics.span('directions_offline'):
+            route = self.graph.route(origin, destination)
+        metrics.inc('directions_total', source='offline' if route is not None else 'none')
+        return route
@@ -0,0 +1,177 @@
+import argparse
+import hashlib
+import http.client
+import io
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import metrics
+from content import GUIDES_PATH, load_guides
+from knowledge_base import load_knowledge_base, load_shard
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'images')
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_FETCH_TIMEOUT_SECONDS = 10
+
+# After a failed fetch, serve the URL directly for this long instead of retrying on every render
+FAILURE_RETRY_SECONDS = 300
+
+# Widths (pixels) images are downscaled to for each place they appear in the layout
+LOGO_WIDTH = 300  # shown at 150px, kept sharp on high-density screens
+BANNER_WIDTH = 1000  # centre column
+ANSWER_IMAGE_WIDTH = 500  # chat column
+
+
+# Disk cache of remote images: each URL is fetched once, downscaled per display width and served as local bytes.
+# The directory is bounded to max_bytes by evicting the least recently used files.
+class ImageCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, timeout=DEFAULT_FETCH_TIMEOUT_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._failed_at = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, width):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{key}_{width or "orig"}')
+
+    # One lock per file, so concurrent sessions asking for the same image fetch it only once
+    def _lock(self, path):
+        with self._locks_lock:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as cached:
+                data = cached.read()
+        except OSError:
+            return None
+        os.utime(path)  # mark as recently used
+        return data
+
+    def _write(self, path, data):
+        temporary_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as cached:
+            cached.write(data)
+        os.replace(temporary_path, path)
+
+    def _fetch(self, url):
+        request = urllib.request.Request(url, headers={'User-Agent': 'BotWander image cache'})
+        with metrics.span('image_fetch'), urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def _original(self, url):
+        path = self._path(url, None)
+        with self._lock(path):
+            data = self._read(path)
+            if data is None:
+                data = self._fetch(url)
+                self._write(path, data)
+        return data
+
+    # Return the image bytes downscaled to at most width pixels wide (width=None keeps the original size).
+    # Returns None if the image cannot be fetched or decoded, so callers can fall back to the URL.
+    def get(self, url, width=None):
+        path = self._path(url, width)
+        data = self._read(path)
+        if data is not None:
+            metrics.inc('image_cache_total', result='hit')
+            return data
+
+        if time.monotonic() - self._failed_at.get(url, -FAILURE_RETRY_SECONDS) < FAILURE_RETRY_SECONDS:
+            return None
+
+        metrics.inc('image_cache_total', result='miss')
+        try:
+            if width:
+                with self._lock(path):
+                    data = self._read(path)
+                    if data is None:
+                        data = downscale(self._original(url), width)
+                        self._write(path, data)
+            else:
+                data = self._original(url)
+        except (OSError, ValueError, http.client.HTTPException) as error:
+            metrics.inc('errors_total', span='image_cache', error=type(error).__name__)
+            self._failed_at[url] = time.monotonic()
+            return None
+        self.evict()
+        return data
+
+    # Delete least recently used files until the cache fits in max_bytes
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+
+# Downscale encoded image bytes to at most width pixels wide; smaller images are left as they are
+def downscale(data, width):
+    image = Image.open(io.BytesIO(data))
+    if image.width <= width:
+        return data
+
+    image.thumbnail((width, round(image.height * width / image.width)), Image.LANCZOS)
+    output = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(output, format='PNG', optimize=True)
+    else:
+        image.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+    return output.getvalue()
+
+
+# Every image the app can show, as (url, width) pairs: answer images from every country's knowledge base
+# (or from the given CSVs), banners and the logo
+def prewarm_jobs(csv_paths=None, guides_path=GUIDES_PATH):
+    guides = load_guides(guides_path)
+    if csv_paths:
+        shards = [load_knowledge_base(path) for path in csv_paths]
+    else:
+        shards = [load_shard(country) for country in guides['countries']]
+    answer_urls = sorted({url for kb in shards for url in kb.image_urls if url})
+    banner_urls = sorted({page['image'] for page in guides['countries'].values()})
+    return ([(url, ANSWER_IMAGE_WIDTH) for url in answer_urls] + [(url, BANNER_WIDTH) for url in banner_urls]
+            + [(guides['logo'], LOGO_WIDTH)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prewarm the image cache with every image the app can show")
+    parser.add_argument('command', choices=['prewarm'])
+    parser.add_argument('--csv', action='append', help="Knowledge base CSV (repeatable; default: every country)")
+    parser.add_argument('--guides', default=GUIDES_PATH)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    cache = ImageCache(args.cache_dir, args.max_bytes)
+    jobs = prewarm_jobs(args.csv, args.guides)
+    with ThreadPoolExecutor(args.workers) as pool:
+        results = list(pool.map(lambda job: cache.get(*job), jobs))
+
+    failed = [url for (url, _), data in zip(jobs, results) if data is None]
+    print(f"Cached {len(jobs) - len(failed)} of {len(jobs)} images in {args.cache_dir}")
+    for url in failed:
+        print(f"  failed: {url}")
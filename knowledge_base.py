@@ -0,0 +1,347 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import time
+from collections.abc import Sequence
+from functools import cached_property, partial
+
+import numpy as np
+import pandas as pd
+
+from retrieval import DEFAULT_SIMILARITY_THRESHOLD, TfidfRetriever
+from text_utils import normalize_question
+
+# Columns the chatbot expects in the questions CSV
+REQUIRED_COLUMNS = ('Question', 'Generated_Answer', 'Image URL')
+
+DEFAULT_CSV_PATH = 'questions_and_generated_answers_with_images.csv'
+
+# The knowledge base is partitioned into one CSV per country. Singapore's shard is the original CSV;
+# the others live in knowledge/<country>.csv, and a country without a CSV yet has an empty shard.
+DEFAULT_COUNTRY = 'Singapore'
+KNOWLEDGE_DIR = 'knowledge'
+
+# Compiled artifact layout: header, then one uint64 offset per string (plus an end offset),
+# then the question index (the uint64 hash of every normalized question, sorted, and the row of each hash),
+# then every string UTF-8 encoded back to back, column by column.
+# The header records the source CSV's mtime and size so a stale artifact is detected and rebuilt.
+ARTIFACT_MAGIC = b'BWKB'
+ARTIFACT_VERSION = 2
+_HEADER = struct.Struct('<4sIqqII')  # magic, version, source mtime_ns, source size, rows, columns
+
+# With a shared state backend, one worker compiles a CSV's artifact and TF-IDF index while the others wait
+# this long for it before building their own
+SHARED_BUILD_WAIT_SECONDS = 30
+
+# Published artifacts and indexes expire after this long, so versions superseded by edits to a CSV don't pile up
+# in the backend. Replicas keep what they already loaded, so only workers starting after that build it again.
+SHARED_ARTIFACT_TTL_SECONDS = 24 * 60 * 60
+
+
+# Stable 64-bit hash of a normalized question, used by the compiled artifact's question index
+def question_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# Question index stored in a compiled artifact: sorted question hashes and the row of each, searched in place,
+# so opening an artifact doesn't decode any question and a lookup decodes only the rows whose hash matches
+class ArtifactIndex:
+    def __init__(self, hashes, rows, questions):
+        self._hashes = hashes
+        self._rows = rows
+        self._questions = questions
+
+    # Row of a normalized question, or default if it is not indexed. Equal hashes are ordered by row,
+    # so duplicated questions resolve to their first row; the question text settles hash collisions.
+    def get(self, key, default=None):
+        digest = np.uint64(question_hash(key))
+        position = int(np.searchsorted(self._hashes, digest))
+        while position < len(self._hashes) and self._hashes[position] == digest:
+            row = int(self._rows[position])
+            if normalize_question(self._questions[row]) == key:
+                return row
+            position += 1
+        return default
+
+
+# Knowledge base with a hash index from normalized question to row,
+# plus a TF-IDF retriever for questions that are worded differently
+class KnowledgeBase:
+    def __init__(self, questions, answers, image_urls, index=None):
+        self.questions = questions
+        self.answers = answers
+        self.image_urls = image_urls
+        self.retriever_factory = TfidfRetriever
+        self._index = index
+        if index is None:
+            self._index = {}
+            for row, question in enumerate(questions):
+                # Keep the first row for duplicated questions, like the original DataFrame lookup did
+                self._index.setdefault(normalize_question(question), row)
+
+    # Built on the first fuzzy search, so exact lookups never pay for the TF-IDF matrix
+    @cached_property
+    def retriever(self):
+        return self.retriever_factory(self.questions)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+        if missing:
+            raise KeyError(f"Missing columns in the CSV: {', '.join(missing)}")
+
+        image_urls = [url if pd.notna(url) else None for url in df['Image URL']]
+        return cls(df['Question'].astype(str).tolist(), df['Generated_Answer'].astype(str).tolist(), image_urls)
+
+    def __len__(self):
+        return len(self.questions)
+
+    # Return the row of a question, or None if it is not in the knowledge base
+    def find(self, question):
+        return self._index.get(normalize_question(question))
+
+    # Return (answer, image_url) for a question, or None on a miss
+    def lookup(self, question):
+        row = self.find(question)
+        if row is None:
+            return None
+        return self.answers[row], self.image_urls[row]
+
+    # Like lookup, but falls back to the most similar question above the similarity threshold
+    def search(self, question, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        row = self.find(question)
+        if row is None:
+            match = self.retriever.best_match(question, threshold)
+            if match is None:
+                return None
+            row = match[0]
+        return self.answers[row], self.image_urls[row]
+
+
+# Read-only sequence of strings backed by a memory-mapped artifact; strings are decoded on access.
+# A slice returns a list of the decoded strings.
+class StringTable(Sequence):
+    def __init__(self, buffer, offsets, start, count, empty_as_none=False):
+        self._buffer = buffer
+        self._offsets = offsets[start:start + count + 1]
+        self._empty_as_none = empty_as_none
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        value = str(self._buffer[int(self._offsets[row]):int(self._offsets[row + 1])], 'utf-8')
+        return None if self._empty_as_none and not value else value
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+
+# Default artifact path for a CSV: a .kb file next to the other local caches, named after the CSV and a hash of
+# its absolute path, so CSVs with the same name in different directories don't share an artifact
+def artifact_path_for(csv_path):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    digest = hashlib.sha256(os.path.abspath(csv_path).encode('utf-8')).hexdigest()[:12]
+    return os.path.join('.cache', f'{name}-{digest}.kb')
+
+
+# Compile the CSV into the binary artifact. Written to a temporary file and renamed into place,
+# so processes that already mapped the previous artifact keep a consistent view.
+def compile_knowledge_base(csv_path=DEFAULT_CSV_PATH, artifact_path=None):
+    artifact_path = artifact_path or artifact_path_for(csv_path)
+    source = os.stat(csv_path)
+    kb = KnowledgeBase.from_dataframe(pd.read_csv(csv_path))
+
+    strings = [value or '' for column in (kb.questions, kb.answers, kb.image_urls) for value in column]
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    hashes = np.array([question_hash(normalize_question(question)) for question in kb.questions], dtype='<u8')
+    # A stable sort keeps equal hashes in row order, so duplicated questions find their first row
+    order = np.argsort(hashes, kind='stable').astype('<u8')
+
+    if os.path.dirname(artifact_path):
+        os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    temporary_path = f'{artifact_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as artifact:
+        artifact.write(_HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_VERSION, source.st_mtime_ns, source.st_size,
+                                    len(kb), len(REQUIRED_COLUMNS)))
+        artifact.write(offsets.tobytes())
+        artifact.write(hashes[order].tobytes())
+        artifact.write(order.tobytes())
+        for value in encoded:
+            artifact.write(value)
+    os.replace(temporary_path, artifact_path)
+    return artifact_path
+
+
+# Memory-map a compiled artifact. Returns None if it is missing, unreadable or was built from
+# a different version of the CSV (when csv_path is given).
+def open_compiled(artifact_path, csv_path=None):
+    try:
+        with open(artifact_path, 'rb') as artifact:
+            buffer = mmap.mmap(artifact.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(buffer) < _HEADER.size:
+        return None
+    magic, version, mtime_ns, size, rows, columns = _HEADER.unpack_from(buffer)
+    if magic != ARTIFACT_MAGIC or version != ARTIFACT_VERSION or columns != len(REQUIRED_COLUMNS):
+        return None
+    if csv_path is not None:
+        source = os.stat(csv_path)
+        if (source.st_mtime_ns, source.st_size) != (mtime_ns, size):
+            return None
+
+    # A truncated artifact (e.g. a partial copy) is rejected rather than read past its end
+    index_start = _HEADER.size + 8 * (rows * columns + 1)
+    data_start = index_start + 16 * rows
+    if len(buffer) < data_start or len(buffer) < data_start + struct.unpack_from('<Q', buffer, index_start - 8)[0]:
+        return None
+
+    # The offsets and the question index are zero-copy views into the mapping, so every process shares
+    # the same pages
+    offsets = np.frombuffer(buffer, dtype='<u8', count=rows * columns + 1, offset=_HEADER.size)
+    hashes = np.frombuffer(buffer, dtype='<u8', count=rows, offset=index_start)
+    index_rows = np.frombuffer(buffer, dtype='<u8', count=rows, offset=index_start + 8 * rows)
+    data = memoryview(buffer)[data_start:]
+    questions = StringTable(data, offsets, 0, rows)
+    return KnowledgeBase(
+        questions,
+        StringTable(data, offsets, rows, rows),
+        StringTable(data, offsets, 2 * rows, rows, empty_as_none=True),
+        index=ArtifactIndex(hashes, index_rows, questions),
+    )
+
+
+# SHA-256 of a CSV's content, hex encoded
+def csv_digest(csv_path):
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as source:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Key of a CSV's artifact in a shared backend: a hash of the CSV's content, so every replica with the same CSV
+# finds it whatever the file's mtime on that host
+def shared_artifact_key(csv_path):
+    return f'kb:{ARTIFACT_VERSION}:{csv_digest(csv_path)}'
+
+
+# Write an artifact fetched from a shared backend, restamped with this host's CSV mtime and size
+def _install_artifact(data, csv_path, artifact_path):
+    source = os.stat(csv_path)
+    magic, version, _, _, rows, columns = _HEADER.unpack_from(data)
+    if os.path.dirname(artifact_path):
+        os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+    temporary_path = f'{artifact_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as artifact:
+        artifact.write(_HEADER.pack(magic, version, source.st_mtime_ns, source.st_size, rows, columns))
+        artifact.write(memoryview(data)[_HEADER.size:])
+    os.replace(temporary_path, artifact_path)
+
+
+# Run build() in one worker at a time across a shared backend: returns the published value for key,
+# building and publishing it under a lock if nobody has yet. Returns None if another worker holds the lock
+# for longer than wait seconds. The published value expires after ttl seconds.
+def _build_once(backend, key, build, wait=SHARED_BUILD_WAIT_SECONDS, ttl=SHARED_ARTIFACT_TTL_SECONDS):
+    deadline = time.monotonic() + wait
+    while True:
+        data = backend.get(key)
+        if data is not None:
+            return data
+        if backend.add(f'{key}:lock', b'1', ttl=wait):
+            try:
+                data = build()
+                backend.set(key, data, ttl)
+            finally:
+                backend.delete(f'{key}:lock')
+            return data
+        if time.monotonic() > deadline:
+            return None
+        time.sleep(0.1)
+
+
+# Compiled artifact bytes for a CSV, compiled here or by another worker on the shared backend
+def _compile_to_bytes(csv_path, artifact_path):
+    compile_knowledge_base(csv_path, artifact_path)
+    with open(artifact_path, 'rb') as artifact:
+        return artifact.read()
+
+
+# TF-IDF retriever for a knowledge base, fitted once across the shared backend and loaded by everyone else
+def _shared_retriever(backend, key, documents):
+    try:
+        data = _build_once(backend, f'{key}:index', lambda: TfidfRetriever(documents).to_bytes())
+    except OSError:
+        data = None
+    if data is None:
+        return TfidfRetriever(documents)
+    return TfidfRetriever.from_bytes(documents, data)
+
+
+# Load the knowledge base from its compiled artifact, rebuilding the artifact when the CSV changed.
+# With a shared state backend the artifact and the TF-IDF index are built by one worker and reused by every
+# other worker and replica with the same CSV. Falls back to parsing the CSV directly if the artifact cannot
+# be written (e.g. read-only disk).
+def load_knowledge_base(csv_path=DEFAULT_CSV_PATH, artifact_path=None, backend=None):
+    artifact_path = artifact_path or artifact_path_for(csv_path)
+    key = shared_artifact_key(csv_path) if backend is not None else None
+
+    kb = open_compiled(artifact_path, csv_path)
+    if kb is None and backend is not None:
+        try:
+            data = _build_once(backend, key, partial(_compile_to_bytes, csv_path, artifact_path))
+            if data is not None:
+                _install_artifact(data, csv_path, artifact_path)
+                kb = open_compiled(artifact_path, csv_path)
+        except OSError:
+            kb = None
+    if kb is None:
+        try:
+            compile_knowledge_base(csv_path, artifact_path)
+        except OSError:
+            return KnowledgeBase.from_dataframe(pd.read_csv(csv_path))
+        kb = open_compiled(artifact_path, csv_path) or KnowledgeBase.from_dataframe(pd.read_csv(csv_path))
+
+    if backend is not None:
+        kb.retriever_factory = partial(_shared_retriever, backend, key)
+    return kb
+
+
+# CSV path of a country's knowledge base shard
+def shard_path(country):
+    if country == DEFAULT_COUNTRY:
+        return DEFAULT_CSV_PATH
+    return os.path.join(KNOWLEDGE_DIR, f"{normalize_question(country).replace(' ', '_')}.csv")
+
+
+# Load one country's knowledge base shard (empty if the country has no CSV yet)
+def load_shard(country, backend=None):
+    path = shard_path(country)
+    if not os.path.exists(path):
+        return KnowledgeBase([], [], [])
+    return load_knowledge_base(path, backend=backend)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the questions CSV into a memory-mappable knowledge base")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('csv_path', nargs='?', help="CSV to compile (default: the --country shard)")
+    parser.add_argument('--country', default=DEFAULT_COUNTRY)
+    parser.add_argument('-o', '--output', help="Artifact path (default: .cache/<csv name>-<path hash>.kb)")
+    args = parser.parse_args()
+    args.csv_path = args.csv_path or shard_path(args.country)
+
+    path = compile_knowledge_base(args.csv_path, args.output)
+    print(f"Compiled {args.csv_path} to {path} ({os.path.getsize(path)} bytes)")
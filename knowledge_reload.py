@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import weakref
+
+import metrics
+from knowledge_base import KnowledgeBase, csv_digest, load_knowledge_base
+from text_utils import normalize_question
+
+DEFAULT_POLL_SECONDS = 5
+
+# Length of the content hash reported as a knowledge base's version
+VERSION_LENGTH = 12
+
+
+# Rows added, removed and changed (same question, new answer or image) between two knowledge base versions
+def diff_knowledge_bases(old, new):
+    old_rows = {normalize_question(question): (answer, image_url)
+                for question, answer, image_url in zip(old.questions, old.answers, old.image_urls)}
+    new_rows = {normalize_question(question): (answer, image_url)
+                for question, answer, image_url in zip(new.questions, new.answers, new.image_urls)}
+    return {
+        'added': len(new_rows.keys() - old_rows.keys()),
+        'removed': len(old_rows.keys() - new_rows.keys()),
+        'changed': sum(old_rows[key] != new_rows[key] for key in old_rows.keys() & new_rows.keys()),
+        'rows_before': len(old),
+        'rows_after': len(new),
+    }
+
+
+# A CSV's mtime and size, or None while the file does not exist
+def _signature(csv_path):
+    try:
+        source = os.stat(csv_path)
+    except FileNotFoundError:
+        return None
+    return source.st_mtime_ns, source.st_size
+
+
+# Version of a CSV: the start of its content hash, the same on every replica, or None while it does not exist
+def _version(csv_path):
+    try:
+        return csv_digest(csv_path)[:VERSION_LENGTH]
+    except FileNotFoundError:
+        return None
+
+
+# Poll a watcher until stop is set or the watcher is garbage collected (e.g. dropped from st.cache_resource),
+# holding only a weak reference so the thread does not keep it alive
+def _poll(watcher_ref, stop, poll_seconds):
+    while not stop.wait(poll_seconds):
+        watcher = watcher_ref()
+        if watcher is None:
+            return
+        watcher.check()
+        del watcher
+
+
+# Keeps the knowledge base for one CSV current without restarting the app. A daemon thread polls the CSV;
+# once a change has settled (unchanged for one poll, so a half-written file is not loaded) the new version's
+# artifact and indexes are built in the background and swapped in under a lock. Sessions read `current` per
+# question, so requests already running finish on the old version and nobody waits for the rebuild.
+# A version that fails to load is reported in last_error and the previous one stays in service.
+# Only one watcher polls a CSV at a time: starting a new one (e.g. after the resource cache was cleared) stops
+# the previous one.
+class KnowledgeBaseWatcher:
+    _running = {}  # csv_path -> stop event of the watcher polling it
+    _running_lock = threading.Lock()
+
+    def __init__(self, csv_path, backend=None, poll_seconds=DEFAULT_POLL_SECONDS):
+        self.csv_path = csv_path
+        self.backend = backend
+        self.poll_seconds = poll_seconds
+        self.version = _version(csv_path)
+        self.loaded_at = time.time()
+        self.last_diff = None
+        self.last_error = None
+        self._signature = _signature(csv_path)
+        self._pending = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.current = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.csv_path):
+            return KnowledgeBase([], [], [])
+        return load_knowledge_base(self.csv_path, backend=self.backend)
+
+    # Build the CSV's current version and swap it in; returns the row diff, or None if loading it failed
+    def reload(self):
+        with self._reload_lock:
+            signature = _signature(self.csv_path)
+            try:
+                with metrics.span('kb_reload'):
+                    version = _version(self.csv_path)
+                    kb = self._load()
+                    kb.retriever  # build the TF-IDF index before any session can see this version
+            except Exception as error:
+                with self._lock:
+                    self.last_error = f"{type(error).__name__}: {error}"
+                    self._signature = signature  # don't retry a broken file until it changes again
+                return None
+
+            diff = diff_knowledge_bases(self.current, kb)
+            with self._lock:
+                self.current = kb
+                self.version = version
+                self.loaded_at = time.time()
+                self.last_diff = diff
+                self.last_error = None
+                self._signature = signature
+            metrics.inc('kb_reloads_total')
+            return diff
+
+    # Reload if the CSV changed since the last poll and has not changed since; returns the diff or None
+    def check(self):
+        signature = _signature(self.csv_path)
+        with self._lock:
+            unchanged = signature == self._signature
+        if unchanged:
+            self._pending = None
+            return None
+        if signature != self._pending:
+            self._pending = signature
+            return None
+        self._pending = None
+        return self.reload()
+
+    # Poll from a daemon thread until stop() is called, another watcher starts polling the same CSV, or this
+    # watcher is garbage collected
+    def start(self):
+        with self._running_lock:
+            previous = self._running.get(self.csv_path)
+            if previous is not None:
+                previous.set()
+            self._running[self.csv_path] = self._stop
+        threading.Thread(target=_poll, args=(weakref.ref(self), self._stop, self.poll_seconds), daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._running_lock:
+            if self._running.get(self.csv_path) is self._stop:
+                del self._running[self.csv_path]
+
+    # Version, size and last reload of the knowledge base in service, for the admin panel
+    def status(self):
+        with self._lock:
+            return {
+                'csv_path': self.csv_path,
+                'version': self.version,
+                'rows': len(self.current),
+                'loaded_at': self.loaded_at,
+                'last_diff': self.last_diff,
+                'last_error': self.last_error,
+            }
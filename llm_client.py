@@ -0,0 +1,139 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import openai
+
+import metrics
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 30
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE_SECONDS = 0.5
+DEFAULT_BACKOFF_MAX_SECONDS = 8
+
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+def is_retryable(error):
+    if isinstance(error, (openai.error.RateLimitError, openai.error.Timeout, openai.error.APIConnectionError,
+                          openai.error.ServiceUnavailableError, openai.error.TryAgain)):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is None or error.http_status >= 500
+    return False
+
+
+# Shared OpenAI chat client for all Streamlit sessions in this process.
+# Every call gets a timeout and jittered exponential backoff, at most max_concurrency calls run at once,
+# and concurrent identical requests are coalesced into a single upstream call (single flight).
+class LLMClient:
+    def __init__(self, model, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 max_retries=DEFAULT_MAX_RETRIES, backoff_base=DEFAULT_BACKOFF_BASE_SECONDS,
+                 backoff_max=DEFAULT_BACKOFF_MAX_SECONDS, api_base=None):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.api_base = api_base
+        self.coalesced = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _key(self, messages):
+        payload = json.dumps([self.model, messages], sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    # "Full jitter" backoff: a random delay up to base * 2^attempt, capped at backoff_max
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _create(self, messages, stream):
+        kwargs = {'api_base': self.api_base} if self.api_base else {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                return openai.ChatCompletion.create(
+                    model=self.model, messages=messages, stream=stream, request_timeout=self.timeout, **kwargs
+                )
+            except openai.error.OpenAIError as error:
+                if attempt == self.max_retries or not is_retryable(error):
+                    raise
+                metrics.inc('llm_retries_total', error=type(error).__name__)
+                time.sleep(self._backoff(attempt))
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise openai.error.Timeout("Timed out waiting for a free OpenAI request slot")
+
+    # Register as the leader for a request, or return the in-flight call to wait on
+    def _join(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                metrics.inc('llm_coalesced_total')
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, answer=None, error=None):
+        with self._lock:
+            del self._inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(answer)
+
+    # Return the full answer for a list of chat messages
+    def complete(self, messages):
+        key = self._key(messages)
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            self._acquire()
+            try:
+                response = self._create(messages, stream=False)
+            finally:
+                self._slots.release()
+            answer = response['choices'][0]['message']['content']
+            usage = response.get('usage') or {}
+            metrics.inc('llm_tokens_total', usage.get('prompt_tokens', 0), kind='prompt')
+            metrics.inc('llm_tokens_total', usage.get('completion_tokens', 0), kind='completion')
+        except Exception as error:
+            self._finish(key, future, error=error)
+            raise
+        self._finish(key, future, answer)
+        return answer
+
+    # Yield the answer as text chunks while it is generated.
+    # A request identical to one already in flight waits for it and yields its answer in one chunk.
+    def stream(self, messages):
+        key = self._key(messages)
+        future, leader = self._join(key)
+        if not leader:
+            yield future.result()
+            return
+
+        chunks = []
+        try:
+            self._acquire()
+            try:
+                for chunk in self._create(messages, stream=True):
+                    content = chunk['choices'][0]['delta'].get('content')
+                    if content:
+                        chunks.append(content)
+                        metrics.inc('llm_stream_chunks_total')
+                        yield content
+            finally:
+                self._slots.release()
+        except BaseException as error:
+            # Also covers GeneratorExit when the session reruns mid-stream, so followers are never stranded
+            self._finish(key, future, error=error if isinstance(error, Exception) else openai.error.TryAgain())
+            raise
+        self._finish(key, future, "".join(chunks))
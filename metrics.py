@@ -0,0 +1,139 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+METRIC_PREFIX = 'botwander'
+DEFAULT_METRICS_HOST = '127.0.0.1'
+DEFAULT_METRICS_PORT = 9464
+
+# Histogram buckets for span durations, in seconds
+DURATION_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+# Process-wide counters and span duration histograms, rendered in the Prometheus text format.
+# Finished spans can also be appended to a rotating JSONL log for a local scraper.
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._log = None
+
+    # Add value to a counter, e.g. inc('answers_total', source='csv')
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(DURATION_BUCKETS), 'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+
+    # Time a block of code as a span; exceptions are counted in errors_total before being re-raised
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as exception:
+            error = type(exception).__name__
+            self.inc('errors_total', span=name, error=error)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe('span_seconds', seconds, span=name, **labels)
+            if self._log is not None:
+                self._log.info(json.dumps({'ts': time.time(), 'span': name, 'seconds': seconds, 'error': error,
+                                           **labels}))
+
+    # Also write every finished span as one JSON line, rotating the file at max_bytes
+    def log_to(self, path, max_bytes=10 * 1024 * 1024, backup_count=5):
+        logger = logging.getLogger(f'{METRIC_PREFIX}.metrics.{path}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        if not logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+        self._log = logger
+
+    def render_prometheus(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in self._histograms.items()}
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} counter')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{METRIC_PREFIX}_{name}{_format_labels(labels)} {value}')
+
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} histogram')
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(DURATION_BUCKETS, histogram['buckets']):
+                    lines.append(f'{METRIC_PREFIX}_{name}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+                lines.append(f'{METRIC_PREFIX}_{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} '
+                             f'{histogram["count"]}')
+                lines.append(f'{METRIC_PREFIX}_{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+                lines.append(f'{METRIC_PREFIX}_{name}_count{_format_labels(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Serve /metrics in the Prometheus text format from a daemon thread; returns the server
+def start_http_server(registry, host=DEFAULT_METRICS_HOST, port=DEFAULT_METRICS_PORT):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Default registry shared by the app's modules
+REGISTRY = Metrics()
+inc = REGISTRY.inc
+span = REGISTRY.span
@@ -0,0 +1,168 @@
+"""Offline answer pre-generation: grow the CSV knowledge base from questions it missed at chat time.
+
+1. mine the missed-question logs written by the app,
+2. drop questions the knowledge base already answers (exactly or by similarity),
+3. generate answers with bounded parallel workers, checkpointing each one so an interrupted run resumes,
+4. append the new rows to the CSV and recompile the knowledge base artifact.
+
+Each run grows one country's knowledge base shard (``--country``, Singapore by default).
+Run ``python pregenerate.py --help`` for options; ``--api-base`` points it at a local stub such as stub_openai.py.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+
+import chatbot
+from knowledge_base import DEFAULT_COUNTRY, DEFAULT_CSV_PATH, compile_knowledge_base, load_knowledge_base, shard_path
+from llm_client import LLMClient
+from retrieval import DEFAULT_SIMILARITY_THRESHOLD
+from text_utils import normalize_question
+
+DEFAULT_CHECKPOINT_PATH = os.path.join('.cache', 'pregenerate_checkpoint.jsonl')
+DEFAULT_WORKERS = 4
+
+
+# Checkpoint of a country's run; each shard gets its own so runs for different countries don't mix
+def checkpoint_path_for(country):
+    if country == DEFAULT_COUNTRY:
+        return DEFAULT_CHECKPOINT_PATH
+    root, extension = os.path.splitext(DEFAULT_CHECKPOINT_PATH)
+    return f"{root}_{os.path.splitext(os.path.basename(shard_path(country)))[0]}{extension}"
+
+
+# Count missed questions across the log and its rotated backups; returns [(question, count)], most asked first.
+# Rewordings that normalize to the same key are merged under their most common wording; follow-up questions
+# ("Which of those...?") are skipped.
+# With a country, only questions asked about that country are counted (older lines without one count as Singapore).
+def mine_questions(log_path=chatbot.DEFAULT_MISSED_QUESTIONS_LOG, country=None):
+    counts = Counter()
+    wordings = {}
+    for path in sorted(glob.glob(f'{glob.escape(log_path)}*')):
+        with open(path, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                    question = entry['question'].strip()
+                except (ValueError, KeyError, AttributeError):
+                    continue
+                if entry.get('follow_up'):
+                    continue  # answered from the conversation, meaningless as a standalone CSV row
+                if country is not None and (entry.get('country') or DEFAULT_COUNTRY) != country:
+                    continue
+                key = normalize_question(question)
+                if key:
+                    counts[key] += 1
+                    wordings.setdefault(key, Counter())[question] += 1
+    return [(wordings[key].most_common(1)[0][0], count) for key, count in counts.most_common()]
+
+
+# Keep only questions the knowledge base cannot already answer
+def dedupe(questions, kb, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+    return [question for question in questions if kb.search(question, similarity_threshold) is None]
+
+
+# Answers generated so far, keyed by normalized question
+def load_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as checkpoint:
+            for line in checkpoint:
+                try:
+                    entry = json.loads(line)
+                    key = normalize_question(entry['question'])
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    continue  # a line cut short by an interrupted run, or not an answer at all
+                done[key] = entry
+    return done
+
+
+# Generate answers for questions not yet in the checkpoint, appending each one to the checkpoint as it completes
+def generate_answers(questions, llm_client, checkpoint_path, workers=DEFAULT_WORKERS, country=None):
+    done = load_checkpoint(checkpoint_path)
+    pending = [question for question in questions if normalize_question(question) not in done]
+    if os.path.dirname(checkpoint_path):
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    # An interrupted run can leave its last line unfinished; appending to it would lose the next answer too
+    unfinished = False
+    if os.path.exists(checkpoint_path) and os.path.getsize(checkpoint_path):
+        with open(checkpoint_path, 'rb') as checkpoint:
+            checkpoint.seek(-1, os.SEEK_END)
+            unfinished = checkpoint.read(1) != b'\n'
+
+    lock = threading.Lock()
+    failed = []
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, ThreadPoolExecutor(workers) as pool:
+        if unfinished:
+            checkpoint.write('\n')
+        system = chatbot.system_prompt(country)
+        futures = {pool.submit(llm_client.complete, chatbot.chat_messages(question, system)): question
+                   for question in pending}
+        for future in as_completed(futures):
+            question = futures[future]
+            try:
+                answer = future.result()
+            except openai.error.OpenAIError as error:
+                failed.append((question, error))
+                continue
+            entry = {'question': question, 'answer': answer}
+            with lock:
+                checkpoint.write(json.dumps(entry) + '\n')
+                checkpoint.flush()
+            done[normalize_question(question)] = entry
+    return done, failed
+
+
+# Append checkpointed answers that are not in the CSV yet, then recompile the knowledge base artifact.
+# Returns the number of rows added.
+def merge(done, csv_path=DEFAULT_CSV_PATH):
+    kb = load_knowledge_base(csv_path)
+    new_rows = [entry for entry in done.values() if kb.find(entry['question']) is None]
+    if not new_rows:
+        return 0
+
+    with open(csv_path, 'a', encoding='utf-8', newline='') as knowledge_base_csv:
+        writer = csv.writer(knowledge_base_csv)
+        for entry in new_rows:
+            writer.writerow([entry['question'], entry['answer'], ''])
+    compile_knowledge_base(csv_path)
+    return len(new_rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--log', default=chatbot.DEFAULT_MISSED_QUESTIONS_LOG, help="Missed-question log to mine")
+    parser.add_argument('--country', default=DEFAULT_COUNTRY, help="Knowledge base shard to grow")
+    parser.add_argument('--csv', help="CSV to append to (default: the --country shard)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: one per country under .cache)")
+    parser.add_argument('--min-count', type=int, default=1, help="Only questions asked at least this many times")
+    parser.add_argument('--limit', type=int, help="Generate at most this many answers in this run")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--similarity-threshold', type=float, default=DEFAULT_SIMILARITY_THRESHOLD)
+    parser.add_argument('--api-base', help="OpenAI-compatible endpoint, e.g. a local stub server")
+    parser.add_argument('--dry-run', action='store_true', help="List the questions that would be generated")
+    args = parser.parse_args()
+    args.csv = args.csv or shard_path(args.country)
+    args.checkpoint = args.checkpoint or checkpoint_path_for(args.country)
+
+    mined = [question for question, count in mine_questions(args.log, args.country) if count >= args.min_count]
+    questions = dedupe(mined, load_knowledge_base(args.csv), args.similarity_threshold)[:args.limit]
+    print(f"{len(mined)} missed questions mined, {len(questions)} not answered by the knowledge base")
+    if args.dry_run:
+        for question in questions:
+            print(f"  {question}")
+        raise SystemExit(0)
+
+    openai.api_key = openai.api_key or os.environ.get('OPENAI_API_KEY')
+    client = LLMClient(chatbot.MODEL, max_concurrency=args.workers, api_base=args.api_base)
+    done, failed = generate_answers(questions, client, args.checkpoint, args.workers, args.country)
+    for question, error in failed:
+        print(f"  failed: {question} ({error})")
+    added = merge(done, args.csv)
+    print(f"Added {added} rows to {args.csv}")
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+from text_utils import normalize_question
+
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'llm_responses.sqlite3')
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# How long a write waits for another process's write lock on the database before giving up
+BUSY_TIMEOUT_SECONDS = 2
+
+# Hits only record their access time in memory; the times are written in one transaction once this many have
+# piled up or this many seconds have passed, and before every put, so lookups don't take the write lock
+TOUCH_BATCH_SIZE = 100
+TOUCH_FLUSH_SECONDS = 60
+
+
+# Build the cache key from everything that changes the model's answer
+def cache_key(prompt, model, system_message):
+    payload = json.dumps([model, system_message, normalize_question(prompt)])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Open a SQLite database shared by the sessions' threads (use it under a lock) and by other processes on this host.
+# Write-ahead logging lets readers carry on while one process writes, and writers wait up to timeout for each other.
+def open_database(path, timeout=BUSY_TIMEOUT_SECONDS):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+# Persistent cache of LLM answers shared by every session, with a TTL and LRU eviction.
+# Backed by SQLite so answers survive Streamlit restarts. Database errors (e.g. a lock held too long by another
+# process, or a full disk) make lookups misses and skip stores rather than failing the chat.
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+
+        # Streamlit serves each session from its own thread, so the connection is shared under a lock
+        self._conn = open_database(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+
+    # Return the cached answer, or None if it is missing, older than the TTL or the database can't be read.
+    # Expired entries are left for put to replace or evict.
+    def get(self, prompt, model, system_message):
+        key = cache_key(prompt, model, system_message)
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute("SELECT answer, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as error:
+                metrics.inc('errors_total', span='response_cache', error=type(error).__name__)
+                row = None
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH_SIZE or time.monotonic() - self._flushed_at >= TOUCH_FLUSH_SECONDS:
+                self._flush_touches()
+            return row[0]
+
+    # Write the access times of recent hits; call with the lock held
+    def _flush_touches(self):
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, {}
+        self._flushed_at = time.monotonic()
+        try:
+            with self._conn:
+                self._conn.executemany("UPDATE responses SET accessed_at = ? WHERE key = ?",
+                                       [(accessed_at, key) for key, accessed_at in touched.items()])
+        except sqlite3.Error as error:
+            metrics.inc('errors_total', span='response_cache', error=type(error).__name__)
+
+    # Store an answer and evict the least recently used entries beyond max_entries; skipped if the database
+    # can't be written
+    def put(self, prompt, model, system_message, answer):
+        key = cache_key(prompt, model, system_message)
+        now = time.time()
+        with self._lock:
+            self._flush_touches()
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, answer, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, answer, now, now),
+                    )
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE key IN ("
+                        "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+            except sqlite3.Error as error:
+                metrics.inc('errors_total', span='response_cache', error=type(error).__name__)
+
+    def __len__(self):
+        with self._lock:
+            try:
+                return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            except sqlite3.Error:
+                return 0
+
+    # Hit/miss counters for this process, for measuring how many LLM calls the cache saves
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self),
+        }
+
+
+# Response cache in a StateBackend, so every worker process and replica on the same backend reuses one set of
+# answers. Entries expire after ttl; the backend's own eviction policy (e.g. Redis allkeys-lru) bounds its size.
+# If the backend is unreachable, lookups are misses and answers are not stored.
+class SharedResponseCache:
+    def __init__(self, backend, ttl=DEFAULT_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prompt, model, system_message):
+        try:
+            answer = self.backend.get(f'response:{cache_key(prompt, model, system_message)}')
+        except OSError:
+            answer = None
+        if answer is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return answer.decode('utf-8')
+
+    def put(self, prompt, model, system_message, answer):
+        try:
+            self.backend.set(f'response:{cache_key(prompt, model, system_message)}', answer.encode('utf-8'), self.ttl)
+        except OSError:
+            pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,144 @@
+import io
+import re
+from collections import Counter
+
+import numpy as np
+
+from text_utils import normalize_question
+
+# Default cosine similarity a question must reach to reuse a CSV answer
+DEFAULT_SIMILARITY_THRESHOLD = 0.55
+
+NGRAM_SIZE = 3
+
+# How many nearest questions best_match considers before giving up
+CANDIDATES = 5
+
+# A word counts as present in a text (or known to the documents) when this share of its n-grams occurs there,
+# so typos like "Singapur" still count as "Singapore"
+FAMILIAR_SHARE = 0.6
+
+# Shorter words are too common as n-gram fragments to tell places apart
+MIN_KEY_TERM_LENGTH = 4
+
+
+# Split a normalized question into character n-grams, padding each word so that word boundaries count
+def char_ngrams(text, n=NGRAM_SIZE):
+    grams = []
+    for word in normalize_question(text).split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams.append(padded)
+        else:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+# Numbers in a question (budgets, days, ...) that a reused answer must agree with
+def numbers(text):
+    return {token for token in normalize_question(text).split() if token.isdigit()}
+
+
+# Capitalized words after the first, e.g. place names, normalized
+def capitalized_words(text):
+    words = re.findall(r"[^\W\d_][\w']*", text)[1:]
+    return {normalize_question(word).split()[0] for word in words if word[0].isupper() and word != 'I'}
+
+
+def _share_present(word, grams):
+    word_grams = char_ngrams(word)
+    return sum(gram in grams for gram in word_grams) / len(word_grams)
+
+
+# TF-IDF retriever over character n-grams, stored as an inverted index: for each n-gram, the rows containing it
+# and their L2-normalized weights. Memory grows with the n-grams actually used (about 60 per question, 8 bytes
+# each, so ~0.5 GB for a million questions) rather than with rows x vocabulary as a dense matrix would.
+class TfidfRetriever:
+    def __init__(self, documents):
+        self.documents = documents
+        self.vocabulary = {}
+        rows, columns, counts = [], [], []
+        for row, document in enumerate(documents):
+            for gram, count in Counter(char_ngrams(document)).items():
+                rows.append(row)
+                columns.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                counts.append(count)
+        rows = np.array(rows, dtype=np.int32)
+        columns = np.array(columns, dtype=np.int32)
+
+        # Smoothed inverse document frequency, as in scikit-learn's TfidfVectorizer
+        document_frequency = np.bincount(columns, minlength=len(self.vocabulary))
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weights = np.log1p(np.array(counts, dtype=np.float32)) * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(documents))).astype(np.float32)
+        weights /= norms[rows]
+
+        # Postings sorted by column: column c's rows and weights are at indptr[c]:indptr[c + 1]
+        order = np.argsort(columns, kind='stable')
+        self.rows = rows[order]
+        self.weights = weights[order]
+        self.indptr = np.concatenate([[0], np.cumsum(document_frequency)]).astype(np.int64)
+
+    # Serialize the fitted vocabulary, IDF weights and postings, so other processes can load them instead of fitting
+    def to_bytes(self):
+        output = io.BytesIO()
+        grams = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        np.savez(output, grams=grams, idf=self.idf, rows=self.rows, weights=self.weights, indptr=self.indptr)
+        return output.getvalue()
+
+    @classmethod
+    def from_bytes(cls, documents, data):
+        arrays = np.load(io.BytesIO(data))
+        retriever = cls.__new__(cls)
+        retriever.documents = documents
+        retriever.vocabulary = {gram: column for column, gram in enumerate(arrays['grams'].tolist())}
+        retriever.idf = arrays['idf']
+        retriever.rows = arrays['rows']
+        retriever.weights = arrays['weights']
+        retriever.indptr = arrays['indptr']
+        return retriever
+
+    # Turn a query into a sparse TF-IDF vector as {column: weight}; n-grams never seen in the documents are ignored
+    def vectorize(self, text):
+        counts = Counter(self.vocabulary[gram] for gram in char_ngrams(text) if gram in self.vocabulary)
+        weights = {column: np.log1p(count) * self.idf[column] for column, count in counts.items()}
+        norm = np.sqrt(sum(weight ** 2 for weight in weights.values())) or 1
+        return {column: weight / norm for column, weight in weights.items()}
+
+    # Return the k most similar documents as (row, score) pairs, best first
+    def search(self, text, k=1):
+        if not len(self.documents):
+            return []
+        vector = self.vectorize(text)
+        if not vector:
+            return [(row, 0.0) for row in range(min(k, len(self.documents)))]
+        postings = [slice(self.indptr[column], self.indptr[column + 1]) for column in vector]
+        rows = np.concatenate([self.rows[posting] for posting in postings])
+        weights = np.concatenate([self.weights[posting] * vector[column] for posting, column in zip(postings, vector)])
+        scores = np.bincount(rows, weights=weights, minlength=len(self.documents))
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    # Words a reused answer's question must also contain: capitalized words (places and other names) and words
+    # the documents have nothing like, so "the weather in Tokyo" can't reuse the answer about Singapore's weather
+    def key_terms(self, text):
+        words = {word for word in normalize_question(text).split()
+                 if len(word) >= MIN_KEY_TERM_LENGTH and not word.isdigit()}
+        unfamiliar = {word for word in words if _share_present(word, self.vocabulary) < FAMILIAR_SHARE}
+        return unfamiliar | {word for word in capitalized_words(text) if len(word) >= MIN_KEY_TERM_LENGTH}
+
+    # Return (row, score) of the best match at or above the threshold, or None.
+    # Candidates that mention different numbers or miss a key term are skipped: "under SGD 50" must not reuse
+    # the SGD 30 answer, and "the weather in Tokyo" must not reuse the answer about the weather in Singapore.
+    def best_match(self, text, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        wanted, terms = numbers(text), self.key_terms(text)
+        for row, score in self.search(text, k=CANDIDATES):
+            if score < threshold:
+                break
+            document = self.documents[row]
+            grams = set(char_ngrams(document))
+            if numbers(document) == wanted and all(_share_present(term, grams) >= FAMILIAR_SHARE for term in terms):
+                return row, score
+        return None
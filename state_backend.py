@@ -0,0 +1,68 @@
+from abc import ABC, abstractmethod
+
+# Prefix for every key the app stores, so one Redis database can be shared with other applications
+KEY_PREFIX = 'botwander:'
+
+
+# Raised when a shared backend cannot be reached; an OSError, so callers can fall back as for disk or network errors
+class BackendUnavailable(OSError):
+    pass
+
+
+# Key-value store for state shared between worker processes and replicas.
+# Values are bytes; ttl is in seconds (None keeps the value until it is deleted).
+class StateBackend(ABC):
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        pass
+
+    # Set the key only if it does not exist yet; returns True if it was set (used as a lock)
+    @abstractmethod
+    def add(self, key, value, ttl=None):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+
+# Backend on a Redis-compatible server (Redis, Valkey, or stub_redis.py locally), shared by every worker process
+# and replica pointed at it. Needs the optional redis package.
+class RedisBackend(StateBackend):
+    def __init__(self, url, timeout=5):
+        try:
+            import redis
+        except ImportError as error:
+            raise ImportError("RedisBackend needs the redis package: pip install redis") from error
+        self._errors = redis.RedisError
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def _call(self, command, key, *args, **kwargs):
+        try:
+            return getattr(self._client, command)(KEY_PREFIX + key, *args, **kwargs)
+        except self._errors as error:
+            raise BackendUnavailable(f"Redis {command} failed: {error}") from error
+
+    def get(self, key):
+        return self._call('get', key)
+
+    def set(self, key, value, ttl=None):
+        self._call('set', key, value, ex=int(ttl) if ttl else None)
+
+    def add(self, key, value, ttl=None):
+        return bool(self._call('set', key, value, ex=int(ttl) if ttl else None, nx=True))
+
+    def delete(self, key):
+        self._call('delete', key)
+
+
+# Backend for a URL: redis://, rediss:// or unix:// for a shared server. Returns None for anything else
+# (or nothing), and each process then keeps its own state.
+def backend_from_url(url=None):
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    return None
@@ -0,0 +1,113 @@
+"""Local stand-in for the OpenAI chat completions API, for tests and benchmarks.
+
+Run it with ``python stub_openai.py --port 8001 --delay 0.5`` and point the app at it by setting the
+``openai_api_base`` secret to ``http://127.0.0.1:8001/v1``.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Request handler; behaviour comes from the StubOpenAIServer it is attached to
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        failure = server.record(request)
+        time.sleep(server.delay)
+
+        if failure is not None:
+            self._send_json(failure, {'error': {'message': f'Stub failure {failure}', 'type': 'stub_error'}})
+            return
+
+        answer = server.answer(request)
+        usage = {'prompt_tokens': sum(len(m.get('content', '').split()) for m in request.get('messages', [])),
+                 'completion_tokens': len(answer.split())}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'model': request.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+                'usage': usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for word in answer.split(' '):
+            chunk = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'model': request.get('model'),
+                     'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(server.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+# OpenAI-compatible HTTP server that answers every chat completion with a canned reply.
+# delay: seconds before responding; token_delay: seconds between streamed chunks;
+# fail_first: number of initial requests answered with fail_status (e.g. 429) to exercise retries.
+class StubOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, token_delay=0.0, fail_first=0, fail_status=429,
+                 reply="This is a stub answer about backpacking."):
+        super().__init__((host, port), _Handler)
+        self.delay = delay
+        self.token_delay = token_delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.reply = reply
+        self.requests = []
+        self._lock = threading.Lock()
+
+    @property
+    def api_base(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    # Record a request and return the HTTP status to fail it with, if any
+    def record(self, request):
+        with self._lock:
+            self.requests.append(request)
+            if len(self.requests) <= self.fail_first:
+                return self.fail_status
+        return None
+
+    def answer(self, request):
+        question = request.get('messages', [{}])[-1].get('content', '')
+        return f"{self.reply} You asked: {question}"
+
+    # Serve from a daemon thread; call shutdown() to stop
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--delay', type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument('--fail-first', type=int, default=0, help="Fail this many initial requests")
+    parser.add_argument('--fail-status', type=int, default=429)
+    args = parser.parse_args()
+
+    server = StubOpenAIServer(args.host, args.port, args.delay, args.token_delay, args.fail_first, args.fail_status)
+    print(f"Stub OpenAI API listening on {server.api_base}")
+    server.serve_forever()
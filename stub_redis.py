@@ -0,0 +1,137 @@
+"""Local stand-in for a Redis server, for running several app processes against a shared state backend.
+
+Run it with ``python stub_redis.py --port 6380`` and point every app process at it by setting the
+``state_backend_url`` secret to ``redis://127.0.0.1:6380/0``. Only the commands the app uses are supported.
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+# Request handler speaking RESP2, or RESP3 after HELLO 3; data lives on the StubRedisServer it is attached to
+class _Handler(socketserver.StreamRequestHandler):
+    protocol = 2
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()  # inline command, e.g. from telnet
+        arguments = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            arguments.append(self.rfile.read(length + 2)[:-2])
+        return arguments
+
+    def _reply(self, value):
+        if value is None:
+            self.wfile.write(b'_\r\n' if self.protocol == 3 else b'$-1\r\n')
+        elif isinstance(value, dict):
+            self.wfile.write(b'%%%d\r\n' % len(value))
+            for item in value.items():
+                for part in item:
+                    self._reply(part)
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, Exception):
+            self.wfile.write(f'-ERR {value}\r\n'.encode('utf-8'))
+        elif isinstance(value, str):
+            self.wfile.write(f'+{value}\r\n'.encode('utf-8'))
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def handle(self):
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            if not command:
+                continue
+            try:
+                name = command[0].decode('utf-8').upper()
+                reply = self.server.execute(name, command[1:])
+            except (ValueError, IndexError) as error:
+                reply = error
+            if name == 'HELLO' and isinstance(reply, dict):
+                self.protocol = reply[b'proto']
+            self._reply(reply)
+            self.wfile.flush()
+
+
+# Redis-compatible TCP server keeping strings in memory with optional expiry (GET, SET with EX/PX/NX/XX, DEL,
+# EXISTS, PING, HELLO, SELECT, FLUSHDB); good enough to share state between local processes in tests and benchmarks
+class StubRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self._data = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def _live(self, key, now):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def execute(self, name, arguments):
+        now = time.monotonic()
+        with self._lock:
+            if name == 'PING':
+                return 'PONG'
+            if name == 'HELLO':
+                # Clients that default to RESP3 (e.g. recent redis-py) open with HELLO 3
+                return {b'server': b'stub_redis', b'version': b'7.0.0', b'proto': int(arguments[0]) if arguments else 2}
+            if name in ('SELECT', 'CLIENT'):
+                return 'OK'
+            if name == 'FLUSHDB':
+                self._data.clear()
+                return 'OK'
+            if name == 'GET':
+                entry = self._live(arguments[0], now)
+                return None if entry is None else entry[0]
+            if name == 'EXISTS':
+                return sum(self._live(key, now) is not None for key in arguments)
+            if name == 'DEL':
+                return sum(self._data.pop(key, None) is not None for key in arguments)
+            if name == 'SET':
+                return self._set(arguments, now)
+        raise ValueError(f"unknown command '{name}'")
+
+    def _set(self, arguments, now):
+        key, value, options = arguments[0], arguments[1], [option.upper() for option in arguments[2:]]
+        expires = None
+        if b'EX' in options:
+            expires = now + int(options[options.index(b'EX') + 1])
+        if b'PX' in options:
+            expires = now + int(options[options.index(b'PX') + 1]) / 1000
+        exists = self._live(key, now) is not None
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return None
+        self._data[key] = (value, expires)
+        return 'OK'
+
+    # Serve from a daemon thread; call shutdown() to stop
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args()
+
+    server = StubRedisServer(args.host, args.port)
+    print(f"Stub Redis server listening on {server.url}")
+    server.serve_forever()
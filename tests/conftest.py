@@ -0,0 +1,28 @@
+import os
+import shutil
+
+import pytest
+
+from knowledge_base import DEFAULT_CSV_PATH
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Run from the repository root, like the app, which opens its content and knowledge files by relative path
+@pytest.fixture(autouse=True)
+def in_repo_dir(monkeypatch):
+    monkeypatch.chdir(REPO_DIR)
+
+
+# The bundled Singapore questions CSV
+@pytest.fixture(scope='session')
+def bundled_csv():
+    return os.path.join(REPO_DIR, DEFAULT_CSV_PATH)
+
+
+# A copy of the bundled CSV that a test may edit
+@pytest.fixture
+def csv_path(tmp_path, bundled_csv):
+    path = tmp_path / 'questions.csv'
+    shutil.copy(bundled_csv, path)
+    return str(path)
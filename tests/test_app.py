@@ -0,0 +1,115 @@
+import asyncio
+import json
+import shutil
+import socket
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from conftest import REPO_DIR
+from stub_openai import StubOpenAIServer
+
+pytest.importorskip('streamlit', minversion='1.33')
+
+from streamlit.proto.BackMsg_pb2 import BackMsg  # noqa: E402
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg  # noqa: E402
+from tornado.websocket import websocket_connect  # noqa: E402
+
+QUESTION_PLACEHOLDER = "Enter your travel question here..."
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# The app served by `streamlit run` from a copy of the repository, with its spans logged to spans.jsonl
+@pytest.fixture
+def app(tmp_path):
+    stub = StubOpenAIServer().start()
+    app_dir = tmp_path / 'app'
+    shutil.copytree(REPO_DIR, app_dir, ignore=shutil.ignore_patterns('.git', '.cache', 'tests'))
+    (app_dir / '.streamlit').mkdir()
+    (app_dir / '.streamlit' / 'secrets.toml').write_text(
+        f'openai_api_key = "test"\ngoogle_maps_api_key = "test"\nopenai_api_base = "{stub.api_base}"\n'
+        f'metrics_port = 0\nmetrics_log_path = "{app_dir / "spans.jsonl"}"\n')
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', 'Backpackchat_deploy_key.py', '--server.headless=true',
+         '--server.address=127.0.0.1', f'--server.port={port}', '--browser.gatherUsageStats=false'],
+        cwd=app_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    yield app_dir, port
+    server.terminate()
+    server.wait(10)
+    stub.shutdown()
+
+
+# Connect to the app's websocket like a browser tab does
+async def _connect(port):
+    for _ in range(100):
+        try:
+            return await websocket_connect(f'ws://127.0.0.1:{port}/_stcore/stream')
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError("the app did not start")
+
+
+# Ask the app to rerun and return the ForwardMsgs it sends until the run finishes
+async def _rerun(connection, page_script_hash='', widget=None, fragment_id=''):
+    message = BackMsg()
+    message.rerun_script.query_string = ''
+    message.rerun_script.page_script_hash = page_script_hash
+    message.rerun_script.fragment_id = fragment_id
+    if widget is not None:
+        state = message.rerun_script.widget_states.widgets.add()
+        state.id, state.string_value = widget
+    await connection.write_message(message.SerializeToString(), binary=True)
+
+    messages = []
+    while True:
+        forward = ForwardMsg()
+        forward.ParseFromString(await connection.read_message())
+        messages.append(forward)
+        if forward.WhichOneof('type') == 'script_finished':
+            return messages
+
+
+def _spans(app_dir):
+    with open(app_dir / 'spans.jsonl') as log:
+        return [json.loads(line)['span'] for line in log]
+
+
+def _elements(messages, element_type):
+    return [(message.delta, getattr(message.delta.new_element, element_type)) for message in messages
+            if message.WhichOneof('type') == 'delta' and message.delta.new_element.WhichOneof('type') == element_type]
+
+
+# A question typed into the chat panel reruns only the chat panel fragment, not the sidebar or the page content
+def test_question_reruns_only_the_chat_panel(app, bundled_csv):
+    app_dir, port = app
+    question = pd.read_csv(bundled_csv)['Question'][0]
+
+    async def scenario():
+        connection = await _connect(port)
+        try:
+            messages = await _rerun(connection)
+            page_script_hash = next(message.new_session.page_script_hash for message in messages
+                                    if message.WhichOneof('type') == 'new_session')
+            delta, text_input = next((delta, element) for delta, element in _elements(messages, 'text_input')
+                                     if element.placeholder == QUESTION_PLACEHOLDER)
+            assert delta.fragment_id
+            assert 'render_sidebar' in _spans(app_dir)
+
+            spans_before = len(_spans(app_dir))
+            messages = await _rerun(connection, page_script_hash, (text_input.id, question), delta.fragment_id)
+            return _spans(app_dir)[spans_before:], messages
+        finally:
+            connection.close()
+
+    spans, messages = asyncio.run(scenario())
+    assert 'render_chat' in spans
+    assert 'render_sidebar' not in spans and 'render_content' not in spans
+    assert any('Response:' in markdown.body for _, markdown in _elements(messages, 'markdown'))
@@ -0,0 +1,119 @@
+import json
+import logging
+import re
+
+import chatbot
+from conversation import ConversationMemory
+from knowledge_base import KnowledgeBase
+from response_cache import ResponseCache
+
+
+# LLM client recording its calls instead of asking a model
+class RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def complete(self, messages):
+        self.calls.append(messages)
+        return f"model answer {len(self.calls)}"
+
+    def stream(self, messages):
+        answer = self.complete(messages)
+        yield from re.findall(r'\S+\s*', answer)
+
+
+def make_kb():
+    questions = [f"Where can I find hostel number {row} in Singapore?" for row in range(40)]
+    return KnowledgeBase(questions, [f"Hostel {row} is in Chinatown. " * 20 for row in range(40)], [None] * 40)
+
+
+def test_csv_hits_never_call_the_model(tmp_path):
+    kb, client, memory = make_kb(), RecordingClient(), ConversationMemory(budget=200)
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'))
+    for question in kb.questions:
+        answer, _ = chatbot.generate_response(question, kb, cache, client, memory=memory)
+        assert answer.startswith("Hostel")
+    assert client.calls == []
+
+
+def test_standalone_questions_share_the_response_cache_in_any_session(tmp_path):
+    kb, client = make_kb(), RecordingClient()
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'))
+    chatbot.generate_response("Is tap water safe to drink?", kb, cache, client, memory=ConversationMemory())
+
+    memory = ConversationMemory()
+    chatbot.generate_response(kb.questions[0], kb, cache, client, memory=memory)
+    chatbot.generate_response("Where is the best street food?", kb, cache, client, memory=memory)
+    answer, _ = chatbot.generate_response("Is tap water safe to drink?", kb, cache, client, memory=memory)
+    assert answer == "model answer 1"
+    assert len(client.calls) == 2
+    assert cache.stats()['hits'] == 1
+
+
+def test_follow_ups_see_earlier_csv_answers_and_are_not_shared(tmp_path, caplog):
+    caplog.set_level(logging.INFO, logger=chatbot.missed_questions.name)
+    kb, client, memory = make_kb(), RecordingClient(), ConversationMemory()
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'))
+    chatbot.generate_response(kb.questions[3], kb, cache, client, memory=memory)
+    chatbot.generate_response("Which of those has the best reviews?", kb, cache, client, memory=memory)
+
+    history = [message['content'] for message in client.calls[0]]
+    assert kb.questions[3] in history and kb.answers[3] in history
+    assert json.loads(caplog.records[-1].getMessage())['follow_up'] is True
+
+    # Another session asking the same words without that history gets its own answer
+    chatbot.generate_response("Which of those has the best reviews?", kb, cache, client, memory=ConversationMemory())
+    assert len(client.calls) == 2
+    assert json.loads(caplog.records[-1].getMessage())['follow_up'] is False
+
+
+def test_follow_ups_are_summarized_just_before_the_model_call(tmp_path):
+    kb, client, memory = make_kb(), RecordingClient(), ConversationMemory(budget=100)
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'))
+    for turn in range(6):
+        chatbot.generate_response(f"Tell me more about that food, part {turn}", kb, cache, client, memory=memory)
+    summaries = [messages for messages in client.calls if messages[0]['content'] == chatbot.SUMMARY_INSTRUCTIONS]
+    assert summaries and memory.summary
+
+
+def test_streamed_answers_are_cached_and_remembered_only_once_complete(tmp_path):
+    kb, client, memory = make_kb(), RecordingClient(), ConversationMemory()
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'))
+    chunks, _ = chatbot.generate_response("Is tap water safe to drink?", kb, cache, client, stream=True,
+                                          memory=memory)
+    assert next(chunks) == "model "
+    assert memory.turns == [] and cache.stats()['entries'] == 0
+
+    assert "model " + "".join(chunks) == "model answer 1"
+    assert memory.turns[-1][:2] == ("Is tap water safe to drink?", "model answer 1")
+    answer, _ = chatbot.generate_response("Is tap water safe to drink?", kb, cache, client, stream=True,
+                                          memory=ConversationMemory())
+    assert answer == "model answer 1" and len(client.calls) == 1
+
+
+def test_abandoned_streams_are_not_cached(tmp_path):
+    kb, client, memory = make_kb(), RecordingClient(), ConversationMemory()
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'))
+    chunks, _ = chatbot.generate_response("Is tap water safe to drink?", kb, cache, client, stream=True,
+                                          memory=memory)
+    next(chunks)
+    chunks.close()
+    assert memory.turns == [] and cache.stats()['entries'] == 0
+
+
+def test_countries_get_their_own_system_prompt_and_cache_entries(tmp_path):
+    singapore, malaysia, client = make_kb(), KnowledgeBase([], [], []), RecordingClient()
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'))
+    # A Singapore CSV question asked about Malaysia goes to the model, as Malaysia's shard doesn't answer it
+    answer, _ = chatbot.generate_response(singapore.questions[0], malaysia, cache, client, country='Malaysia')
+    assert answer == "model answer 1"
+    assert client.calls[0][0]['content'] == chatbot.system_prompt('Malaysia')
+    assert 'Malaysia' in client.calls[0][0]['content']
+
+    chatbot.generate_response("Is tap water safe to drink?", singapore, cache, client, country='Singapore')
+    answer, _ = chatbot.generate_response("Is tap water safe to drink?", malaysia, cache, client, country='Malaysia')
+    assert answer == "model answer 3"  # Singapore's cached answer is not reused for Malaysia
+    assert cache.stats()['entries'] == 3
+
+    answer, _ = chatbot.generate_response("Is tap water safe to drink?", malaysia, cache, client, country='Malaysia')
+    assert answer == "model answer 3" and len(client.calls) == 3
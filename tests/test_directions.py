@@ -0,0 +1,58 @@
+import sqlite3
+
+import directions
+from directions import DirectionsService, RouteCache, TransitGraph, route_key
+
+
+def test_route_cache_database_errors_are_misses(tmp_path):
+    path = str(tmp_path / 'routes.sqlite3')
+    cache = RouteCache(path)
+    cache.put('changi airport|bendemeer|transit', {'minutes': 32})
+    assert cache.get('changi airport|bendemeer|transit') == {'minutes': 32}
+    with sqlite3.connect(path) as other:
+        other.execute("DROP TABLE routes")
+
+    assert cache.get('changi airport|bendemeer|transit') is None
+    cache.put('changi airport|bendemeer|transit', {'minutes': 32})
+
+
+def test_offline_route_from_the_airport_to_a_hostel():
+    route = TransitGraph.from_file().route("Changi Airport", "Dream Lodge")
+    assert route['source'] == 'offline'
+    assert route['minutes'] == 32
+    assert route['steps'][0].startswith("Take the East West Line (Changi Airport branch) from Changi Airport")
+    assert route['steps'][-1] == "Walk from Bendemeer MRT station to Dream Lodge"
+
+
+def test_unknown_places_have_no_offline_route():
+    assert TransitGraph.from_file().route("Changi Airport", "Mount Fuji") is None
+
+
+def test_service_falls_back_to_the_mrt_graph_without_an_api_key(tmp_path):
+    cache = RouteCache(str(tmp_path / 'routes.sqlite3'))
+    service = DirectionsService(cache, TransitGraph.from_file())
+    assert service.route("changi airport singapore", "dream lodge")['minutes'] == 32
+    assert cache.get(route_key("changi airport singapore", "dream lodge")) is None  # offline routes aren't cached
+
+
+def test_google_finding_no_route_is_cached_briefly(tmp_path, monkeypatch):
+    calls = []
+
+    def google_directions(origin, destination, api_key, timeout):
+        calls.append((origin, destination))
+        return None
+
+    monkeypatch.setattr(directions, 'google_directions', google_directions)
+    service = DirectionsService(RouteCache(str(tmp_path / 'routes.sqlite3')), TransitGraph.from_file(), api_key='test')
+    assert service.route("Changi Airport", "Mount Fuji") is None
+    assert service.route("changi airport singapore", "mount fuji") is None
+    assert len(calls) == 1
+    # The offline graph still answers while Google's empty result is cached
+    assert service.route("Changi Airport", "Dream Lodge")['source'] == 'offline'
+    assert service.route("Changi Airport", "Dream Lodge")['source'] == 'offline'
+    assert len(calls) == 2
+
+    # Once the short TTL has passed Google is asked again
+    monkeypatch.setattr(directions, 'NO_ROUTE_TTL_SECONDS', -1)
+    service.route("Changi Airport", "Mount Fuji")
+    assert len(calls) == 3
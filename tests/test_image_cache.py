@@ -0,0 +1,72 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from image_cache import ImageCache
+
+
+def _png(width, height):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(output, format='PNG')
+    return output.getvalue()
+
+
+# Local HTTP server with one 800x400 image at /banner.png; everything else is a 404. Records request paths.
+@pytest.fixture
+def server():
+    image = _png(800, 400)
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path != '/banner.png':
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.requests = requests
+    httpd.url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+
+
+def test_images_are_fetched_once_and_downscaled_per_width(tmp_path, server):
+    cache = ImageCache(str(tmp_path / 'images'))
+    url = f'{server.url}/banner.png'
+    small, large = cache.get(url, 100), cache.get(url, 500)
+    assert Image.open(io.BytesIO(small)).size == (100, 50)
+    assert Image.open(io.BytesIO(large)).size == (500, 250)
+    assert Image.open(io.BytesIO(cache.get(url, 1000))).size == (800, 400)
+    assert cache.get(url, 100) == small
+    assert server.requests == ['/banner.png']
+
+    # A new process finds the files on disk
+    assert ImageCache(str(tmp_path / 'images')).get(url, 100) == small
+    assert server.requests == ['/banner.png']
+
+
+def test_failed_fetches_are_not_retried_right_away(tmp_path, server):
+    cache = ImageCache(str(tmp_path / 'images'))
+    url = f'{server.url}/missing.png'
+    assert cache.get(url, 100) is None
+    assert cache.get(url, 100) is None
+    assert server.requests == ['/missing.png']
+
+
+def test_cache_is_bounded_by_evicting_least_recently_used_files(tmp_path, server):
+    cache = ImageCache(str(tmp_path / 'images'), max_bytes=1)
+    cache.get(f'{server.url}/banner.png', 100)
+    assert sum(path.stat().st_size for path in (tmp_path / 'images').iterdir()) <= 1
@@ -0,0 +1,129 @@
+import os
+
+import pandas as pd
+import pytest
+
+import knowledge_base
+from knowledge_base import load_knowledge_base
+from stub_redis import StubRedisServer
+
+
+@pytest.fixture
+def redis_backend():
+    pytest.importorskip('redis')
+    from state_backend import RedisBackend
+    server = StubRedisServer().start()
+    yield server, RedisBackend(server.url)
+    server.shutdown()
+
+
+def test_shared_build_publishes_expiring_artifacts(tmp_path, csv_path, redis_backend):
+    server, backend = redis_backend
+    first = load_knowledge_base(csv_path, str(tmp_path / 'first.kb'), backend)
+    first.retriever
+    second = load_knowledge_base(csv_path, str(tmp_path / 'second.kb'), backend)
+    assert list(second.questions) == list(first.questions)
+    assert second.search(first.questions[0]) == (first.answers[0], first.image_urls[0])
+
+    published = {key.decode(): expires for key, (_, expires) in server._data.items()}
+    key = f"botwander:{knowledge_base.shared_artifact_key(csv_path)}"
+    assert sorted(published) == [key, f"{key}:index"]
+    assert all(expires is not None for expires in published.values())
+
+
+def test_string_table_is_a_sequence(tmp_path, csv_path):
+    kb = load_knowledge_base(csv_path, str(tmp_path / 'kb.kb'))
+    questions = kb.questions
+    assert type(questions).__name__ == 'StringTable'
+    assert questions[:3] == [questions[0], questions[1], questions[2]]
+    assert questions[-2:] == [questions[len(questions) - 2], questions[-1]]
+    assert questions[::40] == list(questions)[::40]
+    assert questions[1] in questions and questions.index(questions[1]) == 1
+    assert kb.image_urls[:len(kb)] == list(kb.image_urls)
+
+
+def test_artifact_paths_differ_for_same_named_csvs(tmp_path):
+    first, second = tmp_path / 'a' / 'questions.csv', tmp_path / 'b' / 'questions.csv'
+    assert knowledge_base.artifact_path_for(str(first)) != knowledge_base.artifact_path_for(str(second))
+    assert knowledge_base.artifact_path_for(str(first)).endswith('.kb')
+
+
+def _append_row(csv_path, question, answer):
+    with open(csv_path, 'a', encoding='utf-8', newline='') as csv:
+        csv.write(f'"{question}","{answer}",\r\n')
+
+
+def test_stale_artifact_is_detected_and_rebuilt(tmp_path, csv_path):
+    artifact_path = str(tmp_path / 'kb.kb')
+    kb = load_knowledge_base(csv_path, artifact_path)
+    assert knowledge_base.open_compiled(artifact_path, csv_path) is not None
+
+    _append_row(csv_path, "Where is the best laksa?", "Katong has famous laksa.")
+    assert knowledge_base.open_compiled(artifact_path, csv_path) is None
+
+    rebuilt = load_knowledge_base(csv_path, artifact_path)
+    assert len(rebuilt) == len(kb) + 1
+    assert rebuilt.lookup("where is the best laksa") == ("Katong has famous laksa.", None)
+    assert knowledge_base.open_compiled(artifact_path, csv_path) is not None
+
+
+def test_corrupt_artifact_is_rebuilt(tmp_path, csv_path):
+    artifact_path = tmp_path / 'kb.kb'
+    artifact_path.write_bytes(b'not an artifact')
+    assert knowledge_base.open_compiled(str(artifact_path), csv_path) is None
+    assert len(load_knowledge_base(csv_path, str(artifact_path))) > 0
+
+
+def test_truncated_artifact_is_rebuilt(tmp_path, csv_path):
+    artifact_path = tmp_path / 'kb.kb'
+    knowledge_base.compile_knowledge_base(csv_path, str(artifact_path))
+    artifact_path.write_bytes(artifact_path.read_bytes()[:-10])
+    assert knowledge_base.open_compiled(str(artifact_path), csv_path) is None
+    assert len(load_knowledge_base(csv_path, str(artifact_path))) > 0
+
+
+def test_artifact_index_matches_the_dataframe_index(tmp_path, csv_path):
+    first_question = pd.read_csv(csv_path)['Question'][0]
+    _append_row(csv_path, first_question.upper(), "A duplicate that should never be returned.")
+    frame = knowledge_base.KnowledgeBase.from_dataframe(pd.read_csv(csv_path))
+    compiled = load_knowledge_base(csv_path, str(tmp_path / 'kb.kb'))
+    assert isinstance(compiled._index, knowledge_base.ArtifactIndex)
+
+    for question in list(frame.questions) + [f"  {first_question.upper()} ", "Not a question in the CSV"]:
+        assert compiled.find(question) == frame.find(question)
+    assert compiled.lookup(first_question)[0] != "A duplicate that should never be returned."
+
+
+def test_artifact_index_resolves_hash_collisions(tmp_path, csv_path, monkeypatch):
+    # Every question hashes the same, so lookups can only tell them apart by the question text
+    monkeypatch.setattr(knowledge_base, 'question_hash', lambda key: 7)
+    frame = knowledge_base.KnowledgeBase.from_dataframe(pd.read_csv(csv_path))
+    compiled = load_knowledge_base(csv_path, str(tmp_path / 'kb.kb'))
+    for question in frame.questions[:20]:
+        assert compiled.find(question) == frame.find(question)
+    assert compiled.find("Not a question in the CSV") is None
+
+
+def test_each_country_has_its_own_shard():
+    assert knowledge_base.shard_path('Singapore') == knowledge_base.DEFAULT_CSV_PATH
+    assert knowledge_base.shard_path('Malaysia') == os.path.join('knowledge', 'malaysia.csv')
+    assert knowledge_base.shard_path('South Korea') == os.path.join('knowledge', 'south_korea.csv')
+
+
+def test_shards_load_from_their_own_csv(tmp_path, monkeypatch, bundled_csv):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'knowledge').mkdir()
+    singapore_question = pd.read_csv(bundled_csv)['Question'][0]
+    pd.DataFrame({'Question': ["Where is the best nasi lemak in Kuala Lumpur?"],
+                  'Generated_Answer': ["Try Village Park in Damansara Uptown."],
+                  'Image URL': [None]}).to_csv(knowledge_base.shard_path('Malaysia'), index=False)
+
+    malaysia = knowledge_base.load_shard('Malaysia')
+    assert len(malaysia) == 1
+    assert malaysia.lookup("where is the best nasi lemak in kuala lumpur") == (
+        "Try Village Park in Damansara Uptown.", None)
+    assert malaysia.search(singapore_question) is None
+
+    # A country without a CSV yet has an empty shard, and nothing is written for it
+    assert len(knowledge_base.load_shard('Laos')) == 0
+    assert sorted(os.listdir('knowledge')) == ['malaysia.csv']
@@ -0,0 +1,73 @@
+import gc
+import shutil
+import threading
+
+import pytest
+
+from knowledge_base import csv_digest
+from knowledge_reload import KnowledgeBaseWatcher
+
+
+# Watchers write artifacts to .cache in the working directory
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def test_version_is_the_content_hash(csv_path):
+    first, second = KnowledgeBaseWatcher(csv_path), KnowledgeBaseWatcher(csv_path)
+    assert first.version == second.version == csv_digest(csv_path)[:12]
+
+
+def test_starting_a_watcher_stops_the_previous_one_for_the_csv(csv_path):
+    first = KnowledgeBaseWatcher(csv_path, poll_seconds=0.01).start()
+    second = KnowledgeBaseWatcher(csv_path, poll_seconds=0.01).start()
+    assert first._stop.is_set() and not second._stop.is_set()
+    second.stop()
+
+
+def test_polling_thread_ends_when_the_watcher_is_dropped(csv_path):
+    before = set(threading.enumerate())
+    watcher = KnowledgeBaseWatcher(csv_path, poll_seconds=0.01).start()
+    [thread] = set(threading.enumerate()) - before
+    del watcher
+    gc.collect()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_check_reloads_a_changed_csv_once_it_settles(csv_path):
+    watcher = KnowledgeBaseWatcher(csv_path)
+    rows = len(watcher.current)
+    assert watcher.check() is None
+
+    with open(csv_path, 'a', encoding='utf-8', newline='') as csv:
+        csv.write('"Where is the best laksa?","Katong has famous laksa.",\r\n')
+    assert watcher.check() is None  # seen changing: wait one more poll in case it is still being written
+    diff = watcher.check()
+
+    assert diff == {'added': 1, 'removed': 0, 'changed': 0, 'rows_before': rows, 'rows_after': rows + 1}
+    assert watcher.current.search("Where is the best laksa?") == ("Katong has famous laksa.", None)
+    assert watcher.status()['version'] == csv_digest(csv_path)[:12]
+    assert watcher.check() is None
+
+
+def test_broken_csv_keeps_the_previous_version(csv_path, bundled_csv):
+    watcher = KnowledgeBaseWatcher(csv_path)
+    kb, version = watcher.current, watcher.version
+    with open(csv_path, 'w', encoding='utf-8') as csv:
+        csv.write("Question,Answer\nIs it hot?,Yes\n")
+    watcher.check()
+    assert watcher.check() is None
+
+    status = watcher.status()
+    assert watcher.current is kb and status['version'] == version
+    assert 'KeyError' in status['last_error']
+    assert watcher.check() is None  # not retried until the file changes again
+
+    shutil.copy(bundled_csv, csv_path)
+    with open(csv_path, 'a', encoding='utf-8', newline='') as csv:
+        csv.write('"Where is the best laksa?","Katong has famous laksa.",\r\n')
+    watcher.check()
+    assert watcher.check()['added'] == 1
+    assert watcher.status()['last_error'] is None
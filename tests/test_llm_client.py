@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+
+from llm_client import LLMClient
+from stub_openai import StubOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Is Singapore safe for solo backpackers?"}]
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setattr(openai, 'api_key', 'test')
+
+
+@pytest.fixture
+def stub(request):
+    server = StubOpenAIServer(**getattr(request, 'param', {})).start()
+    yield server
+    server.shutdown()
+
+
+def client_for(stub):
+    return LLMClient('gpt-3.5-turbo', timeout=5, backoff_base=0.01, api_base=stub.api_base)
+
+
+@pytest.mark.parametrize('stub', [{'delay': 0.3}], indirect=True)
+def test_concurrent_identical_requests_share_one_call(stub):
+    client = client_for(stub)
+    with ThreadPoolExecutor(5) as pool:
+        answers = list(pool.map(lambda _: client.complete(MESSAGES), range(5)))
+    assert len(set(answers)) == 1 and answers[0].endswith("You asked: Is Singapore safe for solo backpackers?")
+    assert len(stub.requests) == 1
+    assert client.coalesced == 4
+
+
+@pytest.mark.parametrize('stub', [{'fail_first': 2}], indirect=True)
+def test_rate_limited_requests_are_retried(stub):
+    assert "You asked" in client_for(stub).complete(MESSAGES)
+    assert len(stub.requests) == 3
+
+
+@pytest.mark.parametrize('stub', [{'fail_first': 2}], indirect=True)
+def test_streams_are_retried(stub):
+    assert "You asked" in "".join(client_for(stub).stream(MESSAGES))
+    assert len(stub.requests) == 3
+
+
+@pytest.mark.parametrize('stub', [{'fail_first': 10}], indirect=True)
+def test_gives_up_after_max_retries(stub):
+    with pytest.raises(openai.error.RateLimitError):
+        client_for(stub).complete(MESSAGES)
+    assert len(stub.requests) == 4
+
+
+@pytest.mark.parametrize('stub', [{'fail_first': 1, 'fail_status': 400}], indirect=True)
+def test_client_errors_are_not_retried(stub):
+    with pytest.raises(openai.error.InvalidRequestError):
+        client_for(stub).complete(MESSAGES)
+    assert len(stub.requests) == 1
@@ -0,0 +1,70 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = metrics.Metrics()
+    registry.observe('span_seconds', 0.003, span='llm')
+    registry.observe('span_seconds', 0.3, span='llm')
+    lines = registry.render_prometheus().splitlines()
+
+    assert '# TYPE botwander_span_seconds histogram' in lines
+    assert 'botwander_span_seconds_bucket{span="llm",le="0.001"} 0' in lines
+    assert 'botwander_span_seconds_bucket{span="llm",le="0.005"} 1' in lines
+    assert 'botwander_span_seconds_bucket{span="llm",le="0.25"} 1' in lines
+    assert 'botwander_span_seconds_bucket{span="llm",le="0.5"} 2' in lines
+    assert 'botwander_span_seconds_bucket{span="llm",le="+Inf"} 2' in lines
+    assert 'botwander_span_seconds_count{span="llm"} 2' in lines
+    assert any(line.startswith('botwander_span_seconds_sum{span="llm"} 0.30') for line in lines)
+
+
+def test_counter_labels_are_escaped():
+    registry = metrics.Metrics()
+    registry.inc('answers_total', source='csv')
+    registry.inc('answers_total', 2, source='a "quoted"\\path\nline')
+    lines = registry.render_prometheus().splitlines()
+
+    assert lines[0] == '# TYPE botwander_answers_total counter'
+    assert 'botwander_answers_total{source="csv"} 1' in lines
+    assert 'botwander_answers_total{source="a \\"quoted\\"\\\\path\\nline"} 2' in lines
+
+
+def test_spans_count_errors_and_are_logged(tmp_path):
+    registry = metrics.Metrics()
+    log_path = tmp_path / 'spans.jsonl'
+    registry.log_to(str(log_path))
+    with registry.span('kb_search', country='Malaysia'):
+        pass
+    with pytest.raises(TimeoutError), registry.span('llm'):
+        raise TimeoutError
+    lines = registry.render_prometheus().splitlines()
+
+    assert 'botwander_errors_total{error="TimeoutError",span="llm"} 1' in lines
+    assert 'botwander_span_seconds_count{span="llm"} 1' in lines
+    assert 'botwander_span_seconds_count{country="Malaysia",span="kb_search"} 1' in lines
+
+    entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [(entry['span'], entry['error'], entry.get('country')) for entry in entries] == [
+        ('kb_search', None, 'Malaysia'), ('llm', 'TimeoutError', None)]
+    assert all(entry['seconds'] >= 0 and entry['ts'] > 0 for entry in entries)
+
+
+def test_metrics_endpoint_serves_the_registry():
+    registry = metrics.Metrics()
+    registry.inc('chat_requests_total')
+    server = metrics.start_http_server(registry, port=0)
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        with urllib.request.urlopen(f'{url}/metrics', timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'botwander_chat_requests_total 1' in response.read().decode('utf-8')
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f'{url}/other', timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,78 @@
+import json
+
+import openai
+import pytest
+
+import knowledge_base
+import pregenerate
+from knowledge_base import load_knowledge_base
+from llm_client import LLMClient
+from stub_openai import StubOpenAIServer
+from text_utils import normalize_question
+
+
+def _write_log(path, entries):
+    with open(path, 'w', encoding='utf-8') as log:
+        for entry in entries:
+            log.write(json.dumps(entry) + '\n')
+
+
+def test_follow_up_questions_are_not_mined(tmp_path):
+    log_path = tmp_path / 'missed_questions.jsonl'
+    _write_log(log_path, [
+        {'question': "Which of those has the best reviews?", 'country': 'Singapore', 'follow_up': True},
+        {'question': "Is tap water safe to drink?", 'country': 'Singapore', 'follow_up': False},
+    ])
+    assert pregenerate.mine_questions(str(log_path)) == [("Is tap water safe to drink?", 1)]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(openai, 'api_key', 'test')
+    server = StubOpenAIServer().start()
+    yield server
+    server.shutdown()
+
+
+def test_questions_are_mined_across_rotated_logs(tmp_path):
+    log_path = tmp_path / 'missed_questions.jsonl'
+    _write_log(log_path, [{'question': "Is tap water safe to drink?"}, {'question': "Where can I try durian?"}])
+    _write_log(f'{log_path}.1', [{'question': "is tap water safe to drink"}, {'question': "Is tap water safe to drink?"}])
+    _write_log(f'{log_path}.2', [{'question': "Where is the best pho?", 'country': 'Vietnam'}])
+
+    assert pregenerate.mine_questions(str(log_path)) == [
+        ("Is tap water safe to drink?", 3), ("Where can I try durian?", 1), ("Where is the best pho?", 1)]
+    assert pregenerate.mine_questions(str(log_path), 'Vietnam') == [("Where is the best pho?", 1)]
+
+
+def test_generation_resumes_from_an_interrupted_checkpoint(tmp_path, stub):
+    checkpoint_path = tmp_path / 'checkpoint.jsonl'
+    checkpoint_path.write_text(
+        json.dumps({'question': "Is tap water safe to drink?", 'answer': "Yes, it is."}) + '\n'
+        + json.dumps({'answer': "A line without a question"}) + '\n'
+        + '{"question": "Where can I try dur', encoding='utf-8')
+    questions = ["Is tap water safe to drink?", "Where can I try durian?", "Where is the best laksa?"]
+    client = LLMClient('gpt-3.5-turbo', timeout=5, backoff_base=0.01, api_base=stub.api_base)
+
+    done, failed = pregenerate.generate_answers(questions, client, str(checkpoint_path), workers=2)
+    assert failed == []
+    assert len(stub.requests) == 2  # the answer already in the checkpoint is not generated again
+    assert done[normalize_question("Is tap water safe to drink?")]['answer'] == "Yes, it is."
+    assert done[normalize_question("Where can I try durian?")]['answer'].endswith("You asked: Where can I try durian?")
+    assert pregenerate.load_checkpoint(str(checkpoint_path)).keys() == done.keys()
+
+    pregenerate.generate_answers(questions, client, str(checkpoint_path), workers=2)
+    assert len(stub.requests) == 2
+
+
+def test_merge_appends_new_answers_and_recompiles(tmp_path, csv_path):
+    existing = load_knowledge_base(csv_path).questions[0]
+    done = {normalize_question(question): {'question': question, 'answer': answer} for question, answer in [
+        (existing, "Should not replace the CSV answer."), ("Where is the best laksa?", "Katong has famous laksa.")]}
+
+    assert pregenerate.merge(done, csv_path) == 1
+    kb = knowledge_base.open_compiled(knowledge_base.artifact_path_for(csv_path), csv_path)
+    assert kb is not None  # recompiled after the append
+    assert kb.lookup("where is the best laksa") == ("Katong has famous laksa.", None)
+    assert kb.lookup(existing)[0] != "Should not replace the CSV answer."
+    assert pregenerate.merge(done, csv_path) == 0
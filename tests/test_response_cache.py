@@ -0,0 +1,62 @@
+import sqlite3
+
+import response_cache
+from response_cache import ResponseCache
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'), ttl=60)
+    cache.put("Is tap water safe?", "model", "system", "Yes")
+    now[0] += 59
+    assert cache.get("is tap water safe", "model", "system") == "Yes"
+    now[0] += 2
+    assert cache.get("Is tap water safe?", "model", "system") is None
+    assert cache.get("Is tap water safe?", "model", "another system prompt") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'time', lambda: now[0])
+    cache = ResponseCache(str(tmp_path / 'responses.sqlite3'), max_entries=2)
+    for question in ("first?", "second?"):
+        now[0] += 1
+        cache.put(question, "model", "system", f"answer to {question}")
+    now[0] += 1
+    assert cache.get("first?", "model", "system") == "answer to first?"
+    now[0] += 1
+    cache.put("third?", "model", "system", "answer to third?")
+
+    assert len(cache) == 2
+    assert cache.get("second?", "model", "system") is None
+    assert cache.get("first?", "model", "system") == "answer to first?"
+    assert cache.get("third?", "model", "system") == "answer to third?"
+
+
+def test_database_errors_are_misses_and_skipped_puts(tmp_path):
+    path = str(tmp_path / 'responses.sqlite3')
+    cache = ResponseCache(path)
+    cache.put("Is tap water safe?", "model", "system", "Yes")
+    with sqlite3.connect(path) as other:
+        other.execute("DROP TABLE responses")
+
+    assert cache.get("Is tap water safe?", "model", "system") is None
+    cache.put("Is tap water safe?", "model", "system", "Yes")
+    assert cache.stats()['misses'] == 1
+
+
+def test_hits_do_not_write_until_flushed(tmp_path):
+    path = str(tmp_path / 'responses.sqlite3')
+    cache = ResponseCache(path)
+    cache.put("Is tap water safe?", "model", "system", "Yes")
+    with sqlite3.connect(path) as other:
+        stored_at = other.execute("SELECT accessed_at FROM responses").fetchone()[0]
+
+    assert cache.get("Is tap water safe?", "model", "system") == "Yes"
+    with sqlite3.connect(path) as other:
+        assert other.execute("SELECT accessed_at FROM responses").fetchone()[0] == stored_at
+    cache.put("Is the MRT cheap?", "model", "system", "Yes")
+    with sqlite3.connect(path) as other:
+        touched = other.execute("SELECT accessed_at FROM responses ORDER BY created_at").fetchone()[0]
+    assert touched > stored_at
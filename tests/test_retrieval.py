@@ -0,0 +1,48 @@
+import pytest
+
+from knowledge_base import load_knowledge_base
+from pregenerate import dedupe
+from retrieval import TfidfRetriever
+
+
+# The bundled Singapore knowledge base, compiled into a temporary artifact
+@pytest.fixture(scope='module')
+def kb(tmp_path_factory, bundled_csv):
+    return load_knowledge_base(bundled_csv, artifact_path=str(tmp_path_factory.mktemp('kb') / 'kb.kb'))
+
+
+@pytest.mark.parametrize('question, expected', [
+    ("What's the weather like in Singapore?", "What is the weather like in Singapore?"),
+    ("whats the wether like in singapore", "What is the weather like in Singapore?"),
+    ("Can you recomend affordable hostles in Singapur under SGD 30?",
+     "Can you recommend some affordable hostels in Singapore for under SGD 30?"),
+    ("Is Singapore safe for backpackers travelling alone?", "Is Singapore safe for solo backpackers?"),
+    ("Where can I sketch in Bugis?",
+     "As a sketcher, where in Bugis might you find inspiring scenes for your sketches?"),
+])
+def test_rewordings_match(kb, question, expected):
+    match = kb.retriever.best_match(question)
+    assert match is not None and kb.questions[match[0]] == expected
+
+
+@pytest.mark.parametrize('question', [
+    "What is the weather in Tokyo?",
+    "What is the weather on Mars?",
+    "what is the weather in tokyo",
+    "What is the weather like in Bangkok?",
+    "Can you recommend some affordable hostels in Singapore for under SGD 50?",
+])
+def test_other_places_and_numbers_do_not_match(kb, question):
+    assert kb.retriever.best_match(question) is None
+    assert kb.search(question) is None
+
+
+def test_dedupe_keeps_questions_about_other_places(kb):
+    questions = ["What is the weather in Tokyo?", "What's the weather like in Singapore?"]
+    assert dedupe(questions, kb) == ["What is the weather in Tokyo?"]
+
+
+def test_index_round_trips_through_bytes(kb):
+    loaded = TfidfRetriever.from_bytes(kb.questions, kb.retriever.to_bytes())
+    question = "cheap hostels near Little India"
+    assert loaded.search(question, k=3) == kb.retriever.search(question, k=3)
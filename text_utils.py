@@ -0,0 +1,10 @@
+import re
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+# Normalize a question so that case, spacing and punctuation differences map to the same key
+def normalize_question(text):
+    text = _PUNCTUATION.sub(" ", str(text).lower())
+    return _WHITESPACE.sub(" ", text).strip()